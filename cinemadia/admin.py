@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Movie, UserProfile, Favorite, Watchlist, Review, WatchHistory
+from .models import Movie, UserProfile, Favorite, Watchlist, Review, WatchHistory, Genre, Person
 
 
 class ReviewInline(admin.TabularInline):
@@ -18,9 +18,9 @@ class MovieAdmin(admin.ModelAdmin):
         'title', 'year', 'genre', 'category', 'rating', 'is_featured',
         'favorites_count', 'watchlist_count', 'poster_preview'
     )
-    list_filter = ('category', 'genre', 'year', 'is_featured')
+    list_filter = ('category', 'genres', 'year', 'is_featured')
     search_fields = ('title', 'director', 'actors', 'description')
-    readonly_fields = ('slug', 'created_at', 'updated_at', 'poster_preview')
+    readonly_fields = ('slug', 'created_at', 'updated_at', 'poster_preview', 'favorites_count', 'watchlist_count')
     list_editable = ('is_featured', 'rating')
     list_per_page = 25
     inlines = [ReviewInline]
@@ -32,6 +32,7 @@ class MovieAdmin(admin.ModelAdmin):
                 ('year', 'genre', 'category'),
                 ('director', 'actors'),
                 ('duration', 'rating', 'is_featured'),
+                ('favorites_count', 'watchlist_count'),
             )
         }),
         ('📁 Media fayllar', {
@@ -54,14 +55,6 @@ class MovieAdmin(admin.ModelAdmin):
         return '—'
     poster_preview.short_description = 'Poster'
 
-    def favorites_count(self, obj):
-        return obj.favorited_by.count()
-    favorites_count.short_description = 'Sevimlilar'
-
-    def watchlist_count(self, obj):
-        return obj.in_watchlists.count()
-    watchlist_count.short_description = 'Ko\'rish ro\'yxati'
-
     actions = ['belgilanganlarni_premyera_qilish', 'belgilanganlarni_oddiy_qilish']
 
     def belgilanganlarni_premyera_qilish(self, request, queryset):
@@ -78,6 +71,18 @@ class MovieAdmin(admin.ModelAdmin):
         css = {'all': ('admin/css/custom_admin.css',)}
 
 
+@admin.register(Genre)
+class GenreAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug')
+    search_fields = ('name', 'slug')
+
+
+@admin.register(Person)
+class PersonAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug')
+    search_fields = ('name',)
+
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'birth_date', 'created_at')
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CinemadiaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cinemadia'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import spelling
+
+        spelling.load_from_disk()
@@ -0,0 +1,148 @@
+"""Process-local prefix index serving search box suggestions"""
+import threading
+from bisect import bisect_left, insort
+
+from .catalog import person_slug, split_names
+
+TITLE = 'title'
+DIRECTOR = 'director'
+ACTOR = 'actor'
+
+# Titles are listed before people when both match
+KIND_ORDER = {TITLE: 0, DIRECTOR: 1, ACTOR: 2}
+
+# Stop scanning after this many matching keys even if duplicates kept
+# the result list short; bounds the worst case for one-letter prefixes
+SCAN_LIMIT = 200
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def _keys(label):
+    """The label itself plus every suffix starting at a word boundary,
+    so "knight" suggests "The Dark Knight"."""
+    words = normalize(label).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    """Sorted array of ``(key, kind, label, movie_id)`` searched with bisect.
+
+    Built once from the movie table and then patched in place as movies
+    are saved or deleted, so lookups never touch the database.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._by_movie = {}
+        self._slugs = {}
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def _entries_for(self, movie_id, title, director, actors):
+        entries = set()
+        for kind, labels in (
+            (TITLE, [title]),
+            (DIRECTOR, split_names(director)),
+            (ACTOR, split_names(actors)),
+        ):
+            for label in labels:
+                if not label:
+                    continue
+                for key in _keys(label):
+                    entries.add((key, kind, label, movie_id))
+        return entries
+
+    def load(self, rows):
+        """Replace the index with ``(id, slug, title, director, actors)`` rows"""
+        entries = []
+        by_movie = {}
+        slugs = {}
+        for movie_id, slug, title, director, actors in rows:
+            movie_entries = self._entries_for(movie_id, title, director, actors)
+            by_movie[movie_id] = movie_entries
+            slugs[movie_id] = slug
+            entries.extend(movie_entries)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._by_movie = by_movie
+            self._slugs = slugs
+            self.loaded = True
+
+    def remove(self, movie_id):
+        with self._lock:
+            for entry in self._by_movie.pop(movie_id, ()):
+                position = bisect_left(self._entries, entry)
+                if position < len(self._entries) and self._entries[position] == entry:
+                    del self._entries[position]
+            self._slugs.pop(movie_id, None)
+
+    def update(self, movie_id, slug, title, director, actors):
+        with self._lock:
+            self.remove(movie_id)
+            movie_entries = self._entries_for(movie_id, title, director, actors)
+            for entry in movie_entries:
+                insort(self._entries, entry)
+            self._by_movie[movie_id] = movie_entries
+            self._slugs[movie_id] = slug
+
+    def suggest(self, query, limit=8):
+        """Return up to ``limit`` ``{'label', 'kind', 'slug'}`` dicts.
+
+        ``slug`` is the movie slug for titles and the person slug otherwise.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._entries, (prefix,))
+            end = min(len(self._entries), position + SCAN_LIMIT)
+            for key, kind, label, movie_id in self._entries[position:end]:
+                if not key.startswith(prefix):
+                    break
+                if (kind, label) in seen:
+                    continue
+                seen.add((kind, label))
+                results.append({
+                    'label': label,
+                    'kind': kind,
+                    'slug': self._slugs.get(movie_id) if kind == TITLE else person_slug(label),
+                })
+                if len(results) >= limit:
+                    break
+        results.sort(key=lambda item: KIND_ORDER[item['kind']])
+        return results
+
+
+index = PrefixIndex()
+_load_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process-wide index, building it on first use"""
+    if not index.loaded:
+        from .models import Movie
+
+        with _load_lock:
+            if not index.loaded:
+                index.load(Movie.objects.values_list('id', 'slug', 'title', 'director', 'actors'))
+    return index
+
+
+def suggest(query, limit=8):
+    return get_index().suggest(query, limit)
+
+
+def movie_saved(movie):
+    if index.loaded:
+        index.update(movie.pk, movie.slug, movie.title, movie.director, movie.actors)
+
+
+def movie_deleted(movie_id):
+    if index.loaded:
+        index.remove(movie_id)
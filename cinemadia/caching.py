@@ -0,0 +1,72 @@
+"""Cache keys scoped to generation counters.
+
+Every cached view fragment includes the current catalog generation in its
+key. Bumping the generation on catalog writes makes all of them
+unreachable at once; the stale entries simply expire. Fragments that also
+depend on votes and reviews add the activity generation to their key.
+
+Generations are counters in the shared cache, moved with ``incr`` so a
+bump is atomic and reaches every process that shares the backend. They
+expire after GENERATION_CACHE_TIMEOUT seconds; a missing generation is
+started again from the current time, never from a value older keys may
+still use, so with a per-process cache a process serves stale fragments
+for at most that long.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG = 'catalog'
+ACTIVITY = 'activity'
+
+_MISSING = object()
+
+
+def _start():
+    """A first value above any the generation had before it expired"""
+    return time.time_ns() // 1000
+
+
+def generation(name=CATALOG):
+    key = f'cinemadia:generation:{name}'
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _start(), settings.GENERATION_CACHE_TIMEOUT)
+        value = cache.get(key)
+    return value
+
+
+def bump_generation(name=CATALOG):
+    key = f'cinemadia:generation:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _start(), settings.GENERATION_CACHE_TIMEOUT)
+
+
+def catalog_generation():
+    return generation(CATALOG)
+
+
+def bump_catalog_generation():
+    bump_generation(CATALOG)
+
+
+def make_key(*parts):
+    """Build a short, backend-safe key for the current generation"""
+    digest = hashlib.md5(
+        '\x1f'.join(str(part) for part in parts).encode('utf-8')
+    ).hexdigest()
+    return f'cinemadia:{catalog_generation()}:{parts[0]}:{digest}'
+
+
+def get_or_build(key, build, timeout):
+    """Return the value cached under ``key``, building and storing it on
+    a miss. Unlike ``cache.get_or_set`` a cached None counts as a hit."""
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
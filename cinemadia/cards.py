@@ -0,0 +1,78 @@
+"""Compact movie card projection for grids and carousels.
+
+Cards only show a few columns, so grids select just those with
+``values()`` and wrap each row in a slotted MovieCard instead of a full
+Movie instance with its description and actor list.
+"""
+from django.core.files.storage import default_storage
+
+# Columns a card renders, plus the sort keys grids paginate on
+CARD_FIELDS = ('id', 'title', 'slug', 'year', 'rating', 'category', 'poster_file', 'poster_url', 'created_at')
+
+
+class MovieCard:
+    """The parts of a movie a card shows, with its poster URL resolved"""
+
+    __slots__ = (
+        'id', 'title', 'slug', 'year', 'rating', 'category', 'poster', 'created_at',
+        'title_highlight', 'search_snippet',
+    )
+
+    def __init__(self, id, title, slug, year, rating, category, poster, created_at=None):
+        self.id = id
+        self.title = title
+        self.slug = slug
+        self.year = year
+        self.rating = rating
+        self.category = category
+        self.poster = poster
+        self.created_at = created_at
+        self.title_highlight = None
+        self.search_snippet = None
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_poster(self):
+        return self.poster
+
+    @classmethod
+    def from_row(cls, row, prefix=''):
+        """Build a card from a ``values()`` row, reading ``prefix`` + field"""
+        poster_file = row[f'{prefix}poster_file']
+        return cls(
+            id=row[f'{prefix}id'],
+            title=row[f'{prefix}title'],
+            slug=row[f'{prefix}slug'],
+            year=row[f'{prefix}year'],
+            rating=row[f'{prefix}rating'],
+            category=row[f'{prefix}category'],
+            poster=default_storage.url(poster_file) if poster_file else row[f'{prefix}poster_url'],
+            created_at=row[f'{prefix}created_at'],
+        )
+
+    def __repr__(self):
+        return f'<MovieCard {self.id}: {self.title}>'
+
+
+def card_values(queryset, prefix='', *extra):
+    """``queryset.values()`` limited to the card columns (under ``prefix``)"""
+    return queryset.values(*(prefix + name for name in CARD_FIELDS), *extra)
+
+
+def to_cards(rows, prefix=''):
+    return [MovieCard.from_row(row, prefix) for row in rows]
+
+
+def cards(queryset):
+    """Evaluate a Movie queryset as a list of cards"""
+    return to_cards(card_values(queryset))
+
+
+def cards_by_id(ids):
+    """Cards for ``ids`` in the same order, skipping ids that no longer exist"""
+    from .models import Movie
+
+    by_id = {card.id: card for card in cards(Movie.objects.filter(id__in=ids))}
+    return [by_id[movie_id] for movie_id in ids if movie_id in by_id]
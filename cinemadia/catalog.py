@@ -0,0 +1,61 @@
+"""Helpers for the free-text catalog fields (genre, director, actors)"""
+from django.utils.text import slugify
+
+# (slug, Uzbek name, aliases) for every genre linked from the site.
+# Aliases cover the English names stored in Movie.genre.
+GENRES = [
+    ('jangari', 'Jangari', ['action']),
+    ('drama', 'Drama', ['drama']),
+    ('komediya', 'Komediya', ['comedy']),
+    ('melodrama', 'Melodrama', ['romance', 'romantic']),
+    ('sarguzasht', 'Sarguzasht', ['adventure']),
+    ('qorquv', "Qo'rqinchli", ['horror']),
+    ('tarixiy', 'Tarixiy', ['history', 'historical']),
+    ('klassika', 'Klassika', ['classic']),
+    ('fantastika', 'Fantastika', ['sci-fi', 'science fiction']),
+    ('hayotiy', 'Hayotiy', ['biography']),
+    ('triller', 'Triller', ['thriller']),
+    ('detektiv', 'Detektiv', ['mystery', 'detective']),
+    ('hujjatli', 'Hujjatli', ['documentary']),
+    ('anime', 'Anime', ['anime']),
+    ('multfilm', 'Multfilm', ['animation']),
+    ('kriminal', 'Kriminal', ['crime']),
+    ('fentezi', 'Fentezi', ['fantasy']),
+    ('afsona', 'Afsona', ['mythology', 'legend']),
+    ('vester', 'Vester', ['western']),
+    ('musiqiy', 'Musiqiy', ['music', 'musical']),
+    ('oilaviy', 'Oilaviy', ['family']),
+    ('jangovar', 'Jangovar', ['war']),
+    ('sport', 'Sport', ['sport']),
+]
+
+GENRE_NAMES = {slug: name for slug, name, aliases in GENRES}
+
+_GENRE_LOOKUP = {}
+for _slug, _name, _aliases in GENRES:
+    for _alias in [_slug, _name, *_aliases]:
+        _GENRE_LOOKUP[_alias.casefold()] = _slug
+
+
+def split_names(text):
+    """Split a comma-separated field into clean, de-duplicated names"""
+    names = []
+    for name in (text or '').split(','):
+        name = ' '.join(name.split())
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def genre_slug(name):
+    """Map an English, Uzbek or slug genre name to its site slug"""
+    name = ' '.join(name.split())
+    return _GENRE_LOOKUP.get(name.casefold()) or slugify(name, allow_unicode=True)
+
+
+def genre_name(slug, fallback=''):
+    return GENRE_NAMES.get(slug, fallback or slug)
+
+
+def person_slug(name):
+    return slugify(name, allow_unicode=True)
@@ -0,0 +1,132 @@
+"""Item-item collaborative "viewers also liked" neighbours.
+
+Favorites, watchlist entries, likes and watch history form a sparse
+user x movie matrix; two movies are similar when the same users engaged
+with both (cosine between their columns). The batch job multiplies the
+movie rows in chunks and stores each movie's top-k in RelatedMovie under
+the 'collaborative' source, so the detail page shelf is an indexed read.
+"""
+from django.db.models import Max
+from django.utils import timezone
+
+from . import related
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # recommendations are only computed where SciPy is installed
+    np = sparse = None
+
+SOURCE = 'collaborative'
+
+# Neighbours stored per movie
+TOP_K = 12
+
+# How much each kind of interaction says about a user's taste
+INTERACTION_WEIGHTS = {'favorite': 3.0, 'like': 2.0, 'watchlist': 1.0, 'watch': 1.0}
+
+# Movie rows multiplied against the whole matrix at once
+CHUNK_SIZE = 512
+
+
+def interaction_sources():
+    """``(kind, queryset, timestamp field)`` for every interaction table"""
+    from .models import Favorite, MovieVote, WatchHistory, Watchlist
+
+    return [
+        ('favorite', Favorite.objects.all(), 'created_at'),
+        ('like', MovieVote.objects.filter(vote_type='like'), 'created_at'),
+        ('watchlist', Watchlist.objects.all(), 'created_at'),
+        ('watch', WatchHistory.objects.all(), 'watched_at'),
+    ]
+
+
+def interaction_matrix():
+    """Return ``(movie ids, matrix)`` where the matrix has one L2-normalized
+    row per movie and one column per user."""
+    pairs = {}
+    for kind, queryset, timestamp in interaction_sources():
+        rows = np.fromiter(
+            (value for pair in queryset.order_by().values_list('user_id', 'movie_id').iterator() for value in pair),
+            dtype=np.int64,
+        )
+        pairs[kind] = rows.reshape(-1, 2)
+    users = np.unique(np.concatenate([rows[:, 0] for rows in pairs.values()]))
+    movie_ids = np.unique(np.concatenate([rows[:, 1] for rows in pairs.values()]))
+    shape = (len(movie_ids), len(users))
+    matrix = sparse.csr_matrix(shape, dtype=np.float32)
+    for kind, rows in pairs.items():
+        if not len(rows):
+            continue
+        # Repeated rows (watching a movie twice) count once per kind
+        seen = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32),
+             (np.searchsorted(movie_ids, rows[:, 1]), np.searchsorted(users, rows[:, 0]))),
+            shape=shape,
+        ).sign()
+        matrix = matrix + seen * INTERACTION_WEIGHTS[kind]
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    return movie_ids, sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def neighbours(movie_ids, matrix, rows=None, k=TOP_K):
+    """Yield ``(movie id, [(related id, score), ...])`` for the matrix
+    ``rows`` (every movie by default)"""
+    if rows is None:
+        rows = np.arange(len(movie_ids))
+    transposed = matrix.T.tocsr()
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        scores = (matrix[chunk] @ transposed).tocsr()
+        for offset, row in enumerate(chunk):
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            movie_id = movie_ids[row]
+            yield int(movie_id), related.top_neighbours(
+                movie_ids, scores.indices[begin:end], scores.data[begin:end], movie_id, k
+            )
+
+
+def last_run():
+    from .models import RelatedMovie
+
+    return RelatedMovie.objects.filter(source=SOURCE).aggregate(last=Max('computed_at'))['last']
+
+
+def changed_movies(since):
+    """Movies whose neighbours may have moved since ``since``: everything
+    engaged with by a user who has interacted with anything since then."""
+    users = set()
+    for kind, queryset, timestamp in interaction_sources():
+        users.update(
+            queryset.filter(**{f'{timestamp}__gte': since}).order_by().values_list('user_id', flat=True).distinct()
+        )
+    movies = set()
+    for kind, queryset, timestamp in interaction_sources():
+        movies.update(queryset.filter(user_id__in=users).order_by().values_list('movie_id', flat=True).distinct())
+    return movies
+
+
+def rebuild(k=TOP_K, incremental=False):
+    """Store collaborative neighbours; returns the number of movies done.
+
+    With ``incremental`` only the movies touched by interactions since the
+    last run are recomputed (still against the full matrix). Removed
+    favorites and changed votes leave no timestamp, so a full run now and
+    then is what picks those up.
+    """
+    from .models import RelatedMovie
+
+    started = timezone.now()
+    since = last_run() if incremental else None
+    movie_ids, matrix = interaction_matrix()
+    rows = None
+    if since is not None:
+        changed = np.fromiter(changed_movies(since), dtype=np.int64)
+        rows = np.flatnonzero(np.isin(movie_ids, changed))
+    # Each chunk is written in its own short transaction as it is computed
+    related.store(neighbours(movie_ids, matrix, rows, k), source=SOURCE, computed_at=started)
+    if since is None:
+        # Movies nobody interacts with any more were not rewritten
+        RelatedMovie.objects.filter(source=SOURCE, computed_at__lt=started).delete()
+    return len(movie_ids) if rows is None else len(rows)
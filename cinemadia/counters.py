@@ -0,0 +1,130 @@
+"""Movie counts (all, per category, per genre) kept in the counter table,
+and the favorites/watchlist counts kept on each movie.
+
+Signals shift the counts by one as movies are created, moved or deleted
+and as list entries come and go, so reading a count is a primary-key
+lookup instead of a COUNT(*). Bulk jobs wrap their work in ``paused()``,
+which skips the per-row updates, and the per-row invalidation of user
+state and feeds, and reconciles every count once at the end.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+TOTAL = 'all'
+
+_paused = ContextVar('cinemadia_counters_paused', default=False)
+
+
+def category_key(category):
+    return f'category:{category}'
+
+
+def genre_key(slug):
+    return f'genre:{slug}'
+
+
+def is_paused():
+    return _paused.get()
+
+
+def adjust(deltas):
+    """Add ``{key: delta}`` to the counters, creating missing rows"""
+    from .models import MovieCounter
+
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas or is_paused():
+        return
+    MovieCounter.objects.bulk_create(
+        [MovieCounter(key=key, count=0) for key in deltas],
+        ignore_conflicts=True,
+    )
+    for key, delta in deltas.items():
+        MovieCounter.objects.filter(key=key).update(count=F('count') + delta)
+
+
+def get(key):
+    from .models import MovieCounter
+
+    return MovieCounter.objects.filter(key=key).values_list('count', flat=True).first() or 0
+
+
+def total():
+    return get(TOTAL)
+
+
+def category_count(category):
+    return get(category_key(category))
+
+
+def genre_count(slug):
+    return get(genre_key(slug))
+
+
+def compute():
+    """Exact counts from the movie tables, as ``{key: count}``"""
+    from .models import Movie
+
+    counts = Counter({TOTAL: Movie.objects.count()})
+    for category, count in Movie.objects.order_by().values_list('category').annotate(Count('id')):
+        counts[category_key(category)] = count
+    genre_links = Movie.genres.through.objects.order_by().values_list('genre__slug')
+    for slug, count in genre_links.annotate(Count('id')):
+        counts[genre_key(slug)] = count
+    return counts
+
+
+def reconcile():
+    """Rewrite every counter from exact counts; returns the number of rows"""
+    from .models import MovieCounter
+
+    counts = compute()
+    with transaction.atomic():
+        MovieCounter.objects.all().delete()
+        MovieCounter.objects.bulk_create(
+            [MovieCounter(key=key, count=count) for key, count in counts.items()]
+        )
+    return len(counts)
+
+
+def shift_list_count(field, movie_id, delta):
+    """Add ``delta`` to a movie's favorites_count or watchlist_count"""
+    from .models import Movie
+
+    if not is_paused():
+        Movie.objects.filter(pk=movie_id).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def _count_per_movie(model):
+    rows = model.objects.filter(movie=OuterRef('pk')).order_by().values('movie').annotate(count=Count('pk'))
+    return Coalesce(Subquery(rows.values('count'), output_field=IntegerField()), 0)
+
+
+def reconcile_list_counts(movie_ids=None):
+    """Rewrite favorites_count and watchlist_count of every movie, or only
+    of ``movie_ids``"""
+    from .models import Favorite, Movie, Watchlist
+
+    movies = Movie.objects.all() if movie_ids is None else Movie.objects.filter(pk__in=movie_ids)
+    return movies.update(
+        favorites_count=_count_per_movie(Favorite),
+        watchlist_count=_count_per_movie(Watchlist),
+    )
+
+
+@contextmanager
+def paused(reconcile_after=True):
+    """Skip per-row counter updates inside the block, then reconcile
+    unless the caller fixes the counts it touched itself"""
+    token = _paused.set(True)
+    try:
+        yield
+    finally:
+        _paused.reset(token)
+    if reconcile_after:
+        reconcile()
+        reconcile_list_counts()
@@ -0,0 +1,341 @@
+"""Movie embeddings with an approximate nearest-neighbour (IVF) index.
+
+Embeddings are LSA vectors: the TF-IDF rows from cinemadia.related
+reduced to DIMENSIONS by a truncated SVD, so movies sharing people,
+genres or vocabulary land close together and free text can be projected
+into the same space. They are stored as a float32 file that is
+memory-mapped, where row i belongs to the movie id ``ids[i]``.
+
+The index is an inverted file: k-means splits the vectors into about
+sqrt(N) clusters, and a query only scores the vectors in the NPROBE
+clusters whose centroids are closest to it.
+
+Only build_embeddings writes those files. Saving or deleting a movie
+appends one record to a small delta log instead; every process reads
+the records it has not seen yet and keeps them as an overlay that wins
+over the index and is scored exhaustively. The next build merges the
+log into the index, so the command should run periodically. Writes go
+through a file lock, and processes reload the index only after a build.
+"""
+import os
+import pickle
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+from . import related
+
+try:
+    import numpy as np
+    from scipy.sparse.linalg import svds
+except ImportError:  # embeddings are only available where SciPy is installed
+    np = svds = None
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking on this platform
+    fcntl = None
+
+DIMENSIONS = 64
+
+# Clusters scored per query; more is slower but misses fewer neighbours
+NPROBE = 8
+
+KMEANS_ITERATIONS = 10
+
+# Results less similar than this are noise rather than neighbours
+MIN_SIMILARITY = 0.01
+
+# Vectors the centroids are trained on
+TRAINING_SAMPLE = 50000
+
+# Rows scored at once when assigning vectors to clusters
+CHUNK_SIZE = 8192
+
+VECTORS = 'vectors.f32'
+IDS = 'ids.npy'
+ASSIGNMENT = 'assignment.npy'
+CENTROIDS = 'centroids.npy'
+PROJECTION = 'projection.pickle'
+DELTA = 'delta.bin'
+
+# One delta record: a movie id and its vector, or minus the id and zeros
+# for a deleted movie
+DELTA_RECORD = np.dtype([('id', '<i8'), ('vector', '<f4', (DIMENSIONS,))]) if np is not None else None
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def nearest_centroids(vectors, centroids):
+    """Index of the most similar centroid for each row of ``vectors``"""
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), CHUNK_SIZE):
+        chunk = np.asarray(vectors[start:start + CHUNK_SIZE])
+        assignment[start:start + CHUNK_SIZE] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignment
+
+
+def train_centroids(vectors, clusters, seed=0):
+    """Spherical k-means centroids for ``vectors``"""
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), min(len(vectors), TRAINING_SAMPLE), replace=False))])
+    centroids = sample[rng.choice(len(sample), clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        # Empty clusters keep their previous centroid
+        filled = np.bincount(assignment, minlength=clusters) > 0
+        centroids[filled] = _normalize(sums[filled])
+    return centroids
+
+
+class EmbeddingIndex:
+    """Read side: the memory-mapped vectors plus the IVF lists"""
+
+    def __init__(self, directory):
+        directory = Path(directory)
+        self.ids = np.load(directory / IDS)
+        self.centroids = np.load(directory / CENTROIDS)
+        assignment = np.load(directory / ASSIGNMENT)
+        if len(self.ids):
+            self.vectors = np.memmap(directory / VECTORS, dtype=np.float32, mode='r', shape=(len(self.ids), DIMENSIONS))
+        else:
+            self.vectors = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        with open(directory / PROJECTION, 'rb') as handle:
+            self.projection = pickle.load(handle)
+        self._rows = {int(movie_id): row for row, movie_id in enumerate(self.ids)}
+        # Rows grouped by cluster: lists[c] = order[offsets[c]:offsets[c + 1]]
+        self._order = np.argsort(assignment, kind='stable')
+        self._offsets = np.searchsorted(assignment[self._order], np.arange(len(self.centroids) + 1))
+        # Movies saved or deleted since the build: id -> vector, or None
+        self.delta = {}
+        self.delta_size = 0
+        self._apply_delta()
+
+    def __len__(self):
+        return len(self._rows.keys() - self.delta.keys()) + len(self._overlay_ids)
+
+    def read_delta(self, path):
+        """Apply the delta records appended since the last read"""
+        with open(path, 'rb') as handle:
+            handle.seek(self.delta_size)
+            data = handle.read()
+        data = data[:len(data) - len(data) % DELTA_RECORD.itemsize]
+        self.delta_size += len(data)
+        for record in np.frombuffer(data, dtype=DELTA_RECORD):
+            movie_id = int(record['id'])
+            self.delta[abs(movie_id)] = record['vector'].copy() if movie_id > 0 else None
+        self._apply_delta()
+
+    def _apply_delta(self):
+        self._delta_ids = np.fromiter(self.delta, dtype=np.int64, count=len(self.delta))
+        live = [(movie_id, vector) for movie_id, vector in self.delta.items() if vector is not None]
+        self._overlay_ids = np.array([movie_id for movie_id, vector in live], dtype=np.int64)
+        self._overlay = (
+            np.stack([vector for movie_id, vector in live]) if live
+            else np.zeros((0, DIMENSIONS), dtype=np.float32)
+        )
+
+    def vector(self, movie_id):
+        if movie_id in self.delta:
+            return self.delta[movie_id]
+        row = self._rows.get(movie_id)
+        return None if row is None else np.asarray(self.vectors[row])
+
+    def embed(self, genre=None, director=None, actors=None, description=None):
+        """Project movie fields (or free text as ``description``) into
+        the embedding space"""
+        vocabulary, idf, components = (
+            self.projection['vocabulary'], self.projection['idf'], self.projection['components']
+        )
+        terms = related.terms(genre, director, actors, description)
+        return _normalize((related.weighted_rows([terms], vocabulary, idf) @ components)[0].astype(np.float32))
+
+    def search(self, query, k=10, exclude=None, nprobe=NPROBE):
+        """Approximate top ``k`` ``(movie id, score)`` pairs for ``query``"""
+        if not query.any():
+            return []
+        ids = scores = np.zeros(0)
+        if len(self.centroids):
+            probe = np.argsort(-(self.centroids @ query))[:nprobe]
+            rows = np.concatenate([self._order[self._offsets[c]:self._offsets[c + 1]] for c in probe])
+            # The overlay holds the current vector of changed movies
+            rows = rows[~np.isin(self.ids[rows], self._delta_ids)]
+            ids, scores = self.ids[rows], np.asarray(self.vectors[rows]) @ query
+        ids = np.concatenate([ids, self._overlay_ids]).astype(np.int64)
+        scores = np.concatenate([scores, self._overlay @ query])
+        keep = (scores >= MIN_SIMILARITY) & (ids != (-1 if exclude is None else exclude))
+        ids, scores = ids[keep], scores[keep]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            ids, scores = ids[best], scores[best]
+        order = np.lexsort((ids, -scores))
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def directory():
+    return Path(settings.EMBEDDINGS_DIR)
+
+
+def is_available():
+    return np is not None
+
+
+@contextmanager
+def _locked(exclusive):
+    directory().mkdir(parents=True, exist_ok=True)
+    with open(directory() / '.lock', 'a') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _save_array(name, array):
+    path = directory() / name
+    with open(f'{path}.tmp', 'wb') as handle:
+        np.save(handle, array)
+    os.replace(f'{path}.tmp', path)
+
+
+def _version():
+    """Changes whenever a write finishes; the assignment is written last"""
+    try:
+        return os.stat(directory() / ASSIGNMENT).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _delta_size():
+    try:
+        return os.stat(directory() / DELTA).st_size
+    except FileNotFoundError:
+        return 0
+
+
+_index = None
+_index_version = None
+_load_lock = threading.Lock()
+
+
+def get_index():
+    """The current index with every process's saves and deletes applied;
+    None if it was never built"""
+    global _index, _index_version
+    if not is_available():
+        return None
+    version = _version()
+    if version is None:
+        return _index
+    if version != _index_version or _delta_size() != _index.delta_size:
+        with _load_lock, _locked(exclusive=False):
+            version = _version()
+            if version != _index_version:
+                _index = EmbeddingIndex(directory())
+                _index_version = version
+            if _delta_size() > _index.delta_size:
+                _index.read_delta(directory() / DELTA)
+    return _index
+
+
+def _embed_catalog():
+    from .models import Movie
+
+    tfidf = related.RelatedIndex.fit(Movie.objects.values_list(*related.FIELDS).iterator())
+    matrix = tfidf.matrix.astype(np.float64)
+    rank = min(DIMENSIONS, min(matrix.shape) - 1)
+    components = np.zeros((matrix.shape[1], DIMENSIONS), dtype=np.float32)
+    if rank > 0:
+        u, s, vt = svds(matrix, k=rank, random_state=0)
+        components[:, :rank] = vt.T
+    vectors = _normalize(np.asarray(matrix @ components, dtype=np.float32))
+    clusters = max(1, int(np.sqrt(len(vectors)))) if len(vectors) else 0
+    centroids = train_centroids(vectors, clusters) if clusters else np.zeros((0, DIMENSIONS), dtype=np.float32)
+    assignment = nearest_centroids(vectors, centroids) if clusters else np.zeros(0, dtype=np.int32)
+    projection = {'vocabulary': tfidf.vocabulary, 'idf': tfidf.idf, 'components': components}
+    return vectors, tfidf.movie_ids, centroids, assignment, projection
+
+
+def build():
+    """Embed the whole catalog, train the index and merge the delta log
+    into it; returns the number of movies embedded"""
+    # Records appended from here on may postdate the rows just read, so
+    # they are carried over into the new log
+    with _locked(exclusive=True):
+        delta_start = _delta_size()
+    vectors, ids, centroids, assignment, projection = _embed_catalog()
+
+    with _locked(exclusive=True):
+        with open(directory() / DELTA, 'ab+') as handle:
+            handle.seek(delta_start)
+            carried = handle.read()
+        with open(directory() / f'{DELTA}.tmp', 'wb') as handle:
+            handle.write(carried)
+        os.replace(directory() / f'{DELTA}.tmp', directory() / DELTA)
+        path = directory() / VECTORS
+        vectors.tofile(f'{path}.tmp')
+        os.replace(f'{path}.tmp', path)
+        with open(directory() / f'{PROJECTION}.tmp', 'wb') as handle:
+            pickle.dump(projection, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(directory() / f'{PROJECTION}.tmp', directory() / PROJECTION)
+        _save_array(IDS, ids)
+        _save_array(CENTROIDS, centroids)
+        _save_array(ASSIGNMENT, assignment)
+    return len(vectors)
+
+
+def _append(movie_id, vector):
+    record = np.zeros(1, dtype=DELTA_RECORD)
+    record['id'] = movie_id
+    record['vector'] = vector
+    with _locked(exclusive=True):
+        with open(directory() / DELTA, 'ab') as handle:
+            handle.write(record.tobytes())
+
+
+def insert(movie_id, vector):
+    """Add or replace one movie's vector until the next build"""
+    _append(movie_id, vector)
+
+
+def remove(movie_id):
+    """Drop a movie from the results until the next build"""
+    _append(-movie_id, 0)
+
+
+def similar(movie_id, k=10):
+    """``(movie id, score)`` pairs for the movies closest to ``movie_id``"""
+    index = get_index()
+    vector = index.vector(movie_id) if index is not None else None
+    if vector is None:
+        return []
+    return index.search(vector, k, exclude=movie_id)
+
+
+def search(text, k=10):
+    """``(movie id, score)`` pairs for the movies closest to free ``text``"""
+    index = get_index()
+    if index is None:
+        return []
+    return index.search(index.embed(description=text), k)
+
+
+def movie_saved(movie):
+    index = get_index()
+    if index is not None:
+        insert(movie.pk, index.embed(movie.genre, movie.director, movie.actors, movie.description))
+
+
+def movie_deleted(movie_id):
+    if get_index() is not None:
+        remove(movie_id)
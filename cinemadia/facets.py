@@ -0,0 +1,64 @@
+"""Facet counts (category, decade, genre) for a movie result set"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast
+
+from . import catalog
+from .caching import make_key
+
+CATEGORY = 'category'
+DECADE = 'decade'
+GENRE = 'genre'
+
+
+def _grouped(queryset, facet, value):
+    return (
+        queryset.order_by()
+        .annotate(facet=Value(facet, output_field=CharField()), value=value)
+        .values('facet', 'value')
+        .annotate(count=Count('id'))
+        .values_list('facet', 'value', 'count')
+    )
+
+
+def compute_facets(queryset):
+    """Count movies per category, decade and genre in one UNION ALL query"""
+    by_category = _grouped(queryset, CATEGORY, F('category'))
+    by_decade = _grouped(
+        queryset, DECADE, Cast(F('year') / 10 * 10, output_field=CharField())
+    )
+    by_genre = _grouped(
+        queryset.filter(genres__isnull=False), GENRE, F('genres__slug')
+    )
+
+    category_names = dict(queryset.model.CATEGORY_CHOICES)
+    facets = {CATEGORY: [], DECADE: [], GENRE: []}
+    for facet, value, count in by_category.union(by_decade, by_genre, all=True):
+        if facet == CATEGORY:
+            label = category_names.get(value, value)
+        elif facet == DECADE:
+            value = int(value)
+            label = f'{value}-yillar'
+        else:
+            label = catalog.genre_name(value)
+        facets[facet].append({'value': value, 'label': label, 'count': count})
+
+    for items in facets.values():
+        items.sort(key=lambda item: (-item['count'], item['label']))
+    return facets
+
+
+def get_facets(scope, key, queryset):
+    """Return cached facets for ``queryset``, identified by ``scope`` and ``key``.
+
+    ``key`` must fully describe the result set (e.g. the normalized search
+    query or the category slug); entries are dropped when the catalog
+    generation changes.
+    """
+    cache_key = make_key('facets', scope, key)
+    facets = cache.get(cache_key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(cache_key, facets, settings.FACET_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,236 @@
+"""Personalized home feeds: a ranked list of movie ids per user.
+
+A feed blends the genres a user likes (declared in their profile and
+inferred from what they engaged with) with the related and collaborative
+neighbours of their recent history.
+
+Feeds are written to the UserFeed table only off-request, by the
+build_feeds command: in batches for active users and for anyone whose
+interactions are newer than their stored feed, and rows older than
+FEED_MAX_AGE are deleted, so the table holds one row per active user.
+Workers keep the feeds they serve in the size-bounded, LRU-evicted
+'feeds' cache. A visit without a fresh row builds the feed in memory
+without writing it, and a user's own interactions mark their cached
+feed stale so the next visit in that worker rebuilds it the same way.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+
+from . import cards, catalog, collaborative
+
+FEED_SIZE = 24
+
+# Most recent interactions per user that seed the feed
+HISTORY_SIZE = 30
+
+# Each older history item counts this much less than the one after it
+RECENCY_DECAY = 0.9
+
+# Most popular movies considered per liked genre, and liked genres used
+GENRE_CANDIDATES = 60
+TOP_GENRES = 5
+
+# A genre picked in the profile counts as this many interactions with it
+PROFILE_GENRE_WEIGHT = 3.0
+
+# Stored feeds older than this are not served and are deleted by
+# build_feeds, which should run more often than this
+FEED_MAX_AGE = timedelta(hours=6)
+
+# Cached in place of a feed the user's own interactions outdated
+STALE = 'stale'
+
+# Blend of the two normalized signals
+NEIGHBOUR_WEIGHT = 0.6
+GENRE_WEIGHT = 0.4
+
+
+class FeedBuilder:
+    """Builds feeds for batches of users with a fixed number of queries
+    per batch; per-genre candidates are shared across batches."""
+
+    def __init__(self):
+        self._genre_movies = {}
+        self._popular = None
+
+    def genre_movies(self, slug):
+        from .models import Movie
+
+        if slug not in self._genre_movies:
+            self._genre_movies[slug] = list(
+                Movie.objects.filter(genres__slug=slug)
+                .order_by('-popularity_score', '-id')
+                .values_list('id', flat=True)[:GENRE_CANDIDATES]
+            )
+        return self._genre_movies[slug]
+
+    def popular(self):
+        from .models import Movie
+
+        if self._popular is None:
+            self._popular = list(
+                Movie.objects.order_by('-popularity_score', '-id').values_list('id', flat=True)[:FEED_SIZE * 2]
+            )
+        return self._popular
+
+    def _interactions(self, user_ids):
+        """Per user: recent ``(movie id, weight)`` history, newest first,
+        and the set of every movie they already interacted with."""
+        from .models import MovieVote
+
+        events = defaultdict(list)
+        seen = defaultdict(set)
+        for kind, queryset, timestamp in collaborative.interaction_sources():
+            rows = queryset.filter(user_id__in=user_ids).order_by().values_list('user_id', 'movie_id', timestamp)
+            for user_id, movie_id, at in rows:
+                events[user_id].append((at, movie_id, collaborative.INTERACTION_WEIGHTS[kind]))
+                seen[user_id].add(movie_id)
+        # Disliked movies say nothing about taste but are not suggested
+        disliked = MovieVote.objects.filter(user_id__in=user_ids, vote_type='dislike').order_by()
+        for user_id, movie_id in disliked.values_list('user_id', 'movie_id'):
+            seen[user_id].add(movie_id)
+
+        history = {}
+        for user_id, items in events.items():
+            items.sort(key=lambda item: item[0], reverse=True)
+            history[user_id] = [(movie_id, weight) for at, movie_id, weight in items[:HISTORY_SIZE]]
+        return history, seen
+
+    def build(self, user_ids):
+        """Return ``{user id: [movie id, ...]}`` for ``user_ids``"""
+        from .models import Movie, RelatedMovie, UserProfile
+
+        user_ids = list(user_ids)
+        history, seen = self._interactions(user_ids)
+        history_ids = {movie_id for items in history.values() for movie_id, weight in items}
+
+        movie_genres = defaultdict(list)
+        links = Movie.genres.through.objects.filter(movie_id__in=history_ids).values_list('movie_id', 'genre__slug')
+        for movie_id, slug in links:
+            movie_genres[movie_id].append(slug)
+        neighbours = defaultdict(list)
+        rows = RelatedMovie.objects.filter(movie_id__in=history_ids).values_list('movie_id', 'related_id', 'score')
+        for movie_id, related_id, score in rows:
+            neighbours[movie_id].append((related_id, score))
+        profile_genres = dict(
+            UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'favorite_genres')
+        )
+
+        feeds = {}
+        for user_id in user_ids:
+            genres = defaultdict(float)
+            for name in catalog.split_names(profile_genres.get(user_id)):
+                genres[catalog.genre_slug(name)] += PROFILE_GENRE_WEIGHT
+            related = defaultdict(float)
+            for position, (movie_id, weight) in enumerate(history.get(user_id, ())):
+                weight *= RECENCY_DECAY ** position
+                for slug in movie_genres[movie_id]:
+                    genres[slug] += weight
+                for related_id, score in neighbours[movie_id]:
+                    related[related_id] += weight * score
+            feeds[user_id] = self._rank(genres, related, seen[user_id])
+        return feeds
+
+    def _rank(self, genres, related, seen):
+        scores = defaultdict(float)
+        if related:
+            top = max(related.values())
+            for movie_id, score in related.items():
+                scores[movie_id] += NEIGHBOUR_WEIGHT * score / top
+        if genres:
+            liked = sorted(genres.items(), key=lambda item: item[1], reverse=True)[:TOP_GENRES]
+            top = liked[0][1]
+            for slug, affinity in liked:
+                # Popular movies in the genre first, fading down the list
+                for rank, movie_id in enumerate(self.genre_movies(slug)):
+                    scores[movie_id] += GENRE_WEIGHT * affinity / top * (1 - rank / GENRE_CANDIDATES)
+        ranked = sorted(
+            (movie_id for movie_id in scores if movie_id not in seen),
+            key=lambda movie_id: (-scores[movie_id], movie_id),
+        )[:FEED_SIZE]
+        # Users with little history are topped up with what's popular
+        for movie_id in self.popular():
+            if len(ranked) >= FEED_SIZE:
+                break
+            if movie_id not in seen and movie_id not in ranked:
+                ranked.append(movie_id)
+        return ranked
+
+
+def feed_cache():
+    return caches['feeds']
+
+
+def feed_key(user_id):
+    return f'cinemadia:feed:{user_id}'
+
+
+def build_feeds(user_ids, builder=None):
+    """Build the feeds of ``user_ids`` and store them in UserFeed"""
+    from .models import UserFeed
+
+    feeds = (builder or FeedBuilder()).build(user_ids)
+    built_at = timezone.now()
+    UserFeed.objects.bulk_create(
+        [UserFeed(user_id=user_id, movie_ids=ids, built_at=built_at) for user_id, ids in feeds.items()],
+        update_conflicts=True, unique_fields=['user'], update_fields=['movie_ids', 'built_at'],
+    )
+    return feeds
+
+
+def precompute(user_ids, batch_size=500):
+    """Build feeds for ``user_ids`` in batches; returns how many were built"""
+    builder = FeedBuilder()
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        build_feeds(user_ids[start:start + batch_size], builder)
+    return len(user_ids)
+
+
+def outdated_user_ids():
+    """Users with an interaction newer than their stored feed"""
+    user_ids = set()
+    for kind, queryset, timestamp in collaborative.interaction_sources():
+        newer = queryset.filter(**{f'{timestamp}__gt': F('user__feed__built_at')})
+        user_ids.update(newer.order_by().values_list('user_id', flat=True).distinct())
+    return user_ids
+
+
+def prune():
+    """Delete stored feeds too old to be served; returns how many"""
+    from .models import UserFeed
+
+    deleted, _ = UserFeed.objects.filter(built_at__lt=timezone.now() - FEED_MAX_AGE).delete()
+    return deleted
+
+
+def feed_ids(user):
+    """The user's ranked movie ids; never writes to the database"""
+    from .models import UserFeed
+
+    key = feed_key(user.pk)
+    cached = feed_cache().get(key)
+    if cached is not None and cached != STALE:
+        return cached
+    ids = None
+    if cached is None:
+        fresh = UserFeed.objects.filter(user_id=user.pk, built_at__gte=timezone.now() - FEED_MAX_AGE)
+        ids = fresh.values_list('movie_ids', flat=True).first()
+    if ids is None:
+        ids = FeedBuilder().build([user.pk])[user.pk]
+    feed_cache().set(key, ids)
+    return ids
+
+
+def feed_movies(user):
+    return cards.cards_by_id(feed_ids(user))
+
+
+def invalidate(user_id):
+    """Rebuild the user's feed on their next visit; build_feeds replaces
+    the stored one on its next run"""
+    feed_cache().set(feed_key(user_id), STALE)
@@ -0,0 +1,230 @@
+"""Typo- and script-tolerant title/director lookup over a trigram index.
+
+Text is folded to a phonetic Latin skeleton before trigrams are taken,
+so "Intsepshn", "Inception" and "Инсепшн" all index the same way.
+"""
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:  # fuzzy search is skipped without NumPy
+    np = None
+
+# Uzbek and Russian Cyrillic to Uzbek Latin
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'j', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'x', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '',
+    'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya', 'ў': 'o', 'қ': 'q',
+    'ғ': 'g', 'ҳ': 'h',
+}
+_TRANSLITERATION = str.maketrans(CYRILLIC_TO_LATIN)
+
+# Ordered rewrites that collapse common spelling variants
+PHONETIC_RULES = [
+    (re.compile(r'[ts]ion'), 'shn'),
+    (re.compile(r'ch'), '\x01'),
+    (re.compile(r'c(?=[eiy])'), 's'),
+    (re.compile(r'ck|c'), 'k'),
+    (re.compile('\x01'), 'ch'),
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'q'), 'k'),
+    (re.compile(r'w'), 'v'),
+    (re.compile(r'[td]s|tz'), 's'),
+    (re.compile(r'y'), 'i'),
+    (re.compile(r'(.)\1+'), r'\1'),
+]
+
+NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+# Minimum similarity (shared / union of trigrams) for a fuzzy match
+SIMILARITY_THRESHOLD = 0.3
+
+# Rows added since the last compaction before the overlay postings are
+# merged into the arrays
+COMPACT_AFTER = 500
+
+
+def transliterate(text):
+    return text.casefold().translate(_TRANSLITERATION)
+
+
+def normalize(text):
+    """Case-fold, transliterate and strip accents and apostrophes"""
+    text = unicodedata.normalize('NFKD', transliterate(text))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(NON_WORD_RE.sub(' ', text).split())
+
+
+def phonetic(text):
+    text = normalize(text)
+    for pattern, replacement in PHONETIC_RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def trigrams(text):
+    """Padded word trigrams of the phonetic form, as in pg_trgm"""
+    grams = set()
+    for word in phonetic(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Trigram postings over movie titles and directors, held in memory.
+
+    Each title or director is a row; ``_postings`` maps a trigram to a
+    NumPy array of the rows containing it, so scoring a query is a single
+    ``bincount`` over its posting arrays. Saved movies append rows to a
+    small overlay and their old rows are marked dead; the overlay is merged
+    into the arrays every COMPACT_AFTER rows.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._overlay = defaultdict(list)
+        self._overlay_rows = 0
+        self._movie_ids = []
+        self._sizes = []
+        self._rows_by_movie = {}
+        self._arrays = None
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def _add_rows(self, movie_id, texts, postings):
+        rows = []
+        for text in texts:
+            grams = trigrams(text or '')
+            if not grams:
+                continue
+            row = len(self._sizes)
+            self._movie_ids.append(movie_id)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(row)
+            rows.append(row)
+        self._rows_by_movie[movie_id] = rows
+        self._arrays = None
+        return len(rows)
+
+    def load(self, rows):
+        """Replace the index with ``(id, title, director)`` rows"""
+        with self._lock:
+            self._movie_ids = []
+            self._sizes = []
+            self._rows_by_movie = {}
+            postings = defaultdict(list)
+            for movie_id, title, director in rows:
+                self._add_rows(movie_id, (title, director), postings)
+            self._postings = {
+                gram: np.array(movie_rows, dtype=np.int32) for gram, movie_rows in postings.items()
+            }
+            self._overlay = defaultdict(list)
+            self._overlay_rows = 0
+            self.loaded = True
+
+    def remove(self, movie_id):
+        with self._lock:
+            for row in self._rows_by_movie.pop(movie_id, ()):
+                self._sizes[row] = 0
+            self._arrays = None
+
+    def update(self, movie_id, title, director):
+        with self._lock:
+            self.remove(movie_id)
+            self._overlay_rows += self._add_rows(movie_id, (title, director), self._overlay)
+            if self._overlay_rows >= COMPACT_AFTER:
+                self._compact()
+
+    def _compact(self):
+        alive = self._get_arrays()[1] > 0
+        postings = {}
+        for gram in self._postings.keys() | self._overlay.keys():
+            rows = self._postings.get(gram)
+            if gram in self._overlay:
+                extra = np.array(self._overlay[gram], dtype=np.int32)
+                rows = extra if rows is None else np.concatenate([rows, extra])
+            rows = rows[alive[rows]]
+            if len(rows):
+                postings[gram] = rows
+        self._postings = postings
+        self._overlay = defaultdict(list)
+        self._overlay_rows = 0
+
+    def _get_arrays(self):
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self._movie_ids, dtype=np.int64),
+                np.array(self._sizes, dtype=np.int32),
+            )
+        return self._arrays
+
+    def search(self, query, limit=50):
+        """Return movie ids whose title or director resembles ``query``.
+
+        Rows are scored by trigram similarity, ``shared / (query + row -
+        shared)``, and kept when it reaches SIMILARITY_THRESHOLD.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+        with self._lock:
+            movie_ids, sizes = self._get_arrays()
+            postings = [self._postings[gram] for gram in grams if gram in self._postings]
+            postings.extend(
+                np.array(self._overlay[gram], dtype=np.int32) for gram in grams if gram in self._overlay
+            )
+        if not postings:
+            return []
+        shared = np.bincount(np.concatenate(postings), minlength=len(sizes))
+        rows = np.flatnonzero(shared)
+        # Dead rows have size 0 and stay in the postings until compaction
+        rows = rows[sizes[rows] > 0]
+        similarity = shared[rows] / (len(grams) + sizes[rows] - shared[rows])
+        keep = similarity >= SIMILARITY_THRESHOLD
+        rows, similarity = rows[keep], similarity[keep]
+        matches = rows[np.lexsort((movie_ids[rows], -similarity))]
+        ids = []
+        for movie_id in movie_ids[matches].tolist():
+            if movie_id not in ids:
+                ids.append(movie_id)
+                if len(ids) >= limit:
+                    break
+        return ids
+
+
+index = TrigramIndex()
+_load_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process-wide index, building it on first use"""
+    if not index.loaded:
+        from .models import Movie
+
+        with _load_lock:
+            if not index.loaded:
+                index.load(Movie.objects.values_list('id', 'title', 'director').iterator())
+    return index
+
+
+def search_ids(query, limit=50):
+    if np is None:
+        return []
+    return get_index().search(query, limit)
+
+
+def movie_saved(movie):
+    if index.loaded:
+        index.update(movie.pk, movie.title, movie.director)
+
+
+def movie_deleted(movie_id):
+    if index.loaded:
+        index.remove(movie_id)
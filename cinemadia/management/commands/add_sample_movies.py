@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from cinemadia import counters
 from cinemadia.models import Movie
 import random
 
@@ -6,6 +7,11 @@ class Command(BaseCommand):
     help = 'Add real movies to the database'
 
     def handle(self, *args, **kwargs):
+        # Counters are reconciled once at the end instead of per movie
+        with counters.paused():
+            self.add_movies()
+
+    def add_movies(self):
         # Remove existing sample movies
         Movie.objects.filter(title__startswith='Movie').delete()
         Movie.objects.filter(title__startswith='Extra Movie').delete()
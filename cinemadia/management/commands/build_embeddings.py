@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cinemadia import embeddings
+
+
+class Command(BaseCommand):
+    help = 'Embed every movie and rebuild the approximate nearest-neighbour index'
+
+    def handle(self, *args, **options):
+        if not embeddings.is_available():
+            raise CommandError('NumPy and SciPy are required to build embeddings.')
+
+        movies = embeddings.build()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Embeddings built for {movies} movies in {settings.EMBEDDINGS_DIR}.')
+        )
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cinemadia import feeds
+
+
+class Command(BaseCommand):
+    help = 'Precompute personalized home feeds for recently active users and drop expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Users who logged in within this many days')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        users = set(User.objects.filter(is_active=True, last_login__gte=since).values_list('id', flat=True))
+        # Users whose stored feed their own interactions outdated
+        users |= feeds.outdated_user_ids()
+
+        built = feeds.precompute(sorted(users), options['batch_size'])
+        pruned = feeds.prune()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Feeds built for {built} users, {pruned} expired feeds removed.')
+        )
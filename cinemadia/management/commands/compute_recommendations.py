@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cinemadia import collaborative, related
+
+
+class Command(BaseCommand):
+    help = 'Compute "viewers also liked" neighbours from favorites, votes, watchlists and watch history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only recompute movies touched by interactions since the last run',
+        )
+        parser.add_argument('--top', type=int, default=collaborative.TOP_K, help='Neighbours stored per movie')
+
+    def handle(self, *args, **options):
+        if not related.is_available():
+            raise CommandError('NumPy and SciPy are required to compute recommendations.')
+
+        movies = collaborative.rebuild(options['top'], incremental=options['incremental'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Recommendations computed for {movies} movies.')
+        )
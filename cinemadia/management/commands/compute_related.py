@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cinemadia import related
+from cinemadia.models import Movie
+
+
+class Command(BaseCommand):
+    help = 'Compute content-based related movies and store them in the neighbour table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movie', help='Only refresh the movie with this slug')
+        parser.add_argument('--top', type=int, default=related.TOP_K, help='Neighbours stored per movie')
+
+    def handle(self, *args, **options):
+        if not related.is_available():
+            raise CommandError('NumPy and SciPy are required to compute related movies.')
+
+        if options['movie']:
+            movie = Movie.objects.filter(slug=options['movie']).first()
+            if movie is None:
+                raise CommandError(f'No movie with slug "{options["movie"]}".')
+            if not related.refresh_movie(movie, options['top']):
+                raise CommandError('No saved index yet; run compute_related without --movie first.')
+            self.stdout.write(self.style.SUCCESS(f'Related movies refreshed for "{movie.title}".'))
+            return
+
+        movies = related.rebuild(options['top'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Related movies computed for {movies} movies.')
+        )
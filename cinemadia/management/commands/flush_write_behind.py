@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from cinemadia import writebehind
+
+
+class Command(BaseCommand):
+    help = 'Write the buffered clicks left in the journals of stopped processes'
+
+    def handle(self, *args, **options):
+        states = writebehind.replay_orphans()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Write-behind journals replayed: {states} states written.')
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cinemadia import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the movie table'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Full-text search index requires SQLite with FTS5')
+
+        indexed = search.create_index()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Search index rebuilt: {indexed} movies indexed.')
+        )
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cinemadia import spelling
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "did you mean" spelling index and save it to disk'
+
+    def handle(self, *args, **options):
+        words = spelling.rebuild()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Spelling index rebuilt: {words} words saved to {settings.SPELLING_INDEX_PATH}.')
+        )
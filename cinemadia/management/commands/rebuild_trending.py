@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from cinemadia import trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute trending scores from votes, favorites and watch history'
+
+    def handle(self, *args, **options):
+        scored = trending.rebuild()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Trending scores rebuilt: {scored} movies with recent activity.')
+        )
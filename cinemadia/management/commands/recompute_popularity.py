@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from cinemadia import popularity
+from cinemadia.models import Movie
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored popularity score of every movie from its votes'
+
+    def handle(self, *args, **options):
+        updated = Movie.objects.update(popularity_score=popularity.score_expression())
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Popularity recomputed for {updated} movies.')
+        )
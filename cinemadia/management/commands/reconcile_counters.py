@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from cinemadia import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the movie counters (all, per category, per genre) from the movie table'
+
+    def handle(self, *args, **options):
+        rows = counters.reconcile()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Counters reconciled: {rows} counters written, {counters.total()} movies in total.')
+        )
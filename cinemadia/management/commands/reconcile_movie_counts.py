@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from cinemadia import reconciliation
+
+
+class Command(BaseCommand):
+    help = 'Recompute likes, dislikes and review ratings of every movie from the vote and review rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=reconciliation.CHUNK_SIZE, help='Movies per id range')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the drift')
+
+    def handle(self, *args, **options):
+        drift = reconciliation.reconcile_movies(options['chunk_size'], dry_run=options['dry_run'])
+
+        self.stdout.write(f'Movies checked: {drift.movies}')
+        self.stdout.write(f'Movies drifted: {drift.changed}')
+        self.stdout.write(f'Likes off by: {drift.likes} in total')
+        self.stdout.write(f'Dislikes off by: {drift.dislikes} in total')
+        self.stdout.write(f'Ratings changed: {drift.ratings}')
+        self.stdout.write(f'Largest count drift: {drift.largest}')
+        if drift.changed_ids:
+            sample = ', '.join(str(movie_id) for movie_id in drift.changed_ids[:20])
+            self.stdout.write(f'Drifted ids: {sample}{" ..." if drift.changed > 20 else ""}')
+        verb = 'would be corrected' if options['dry_run'] else 'corrected'
+        self.stdout.write(
+            self.style.SUCCESS(f'{drift.changed} of {drift.movies} movies {verb}.')
+        )
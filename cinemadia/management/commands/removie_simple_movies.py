@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from cinemadia import counters
 from cinemadia.models import Movie
 
 class Command(BaseCommand):
@@ -22,8 +23,9 @@ class Command(BaseCommand):
         # Get IDs of movies to keep (most recent ones)
         movies_to_keep = Movie.objects.order_by('-id')[:keep_count].values_list('id', flat=True)
         
-        # Delete all movies not in the keep list
-        deleted_count, _ = Movie.objects.exclude(id__in=movies_to_keep).delete()
+        # Delete all movies not in the keep list, reconciling counters once
+        with counters.paused():
+            deleted_count, _ = Movie.objects.exclude(id__in=movies_to_keep).delete()
         
         self.stdout.write(
             self.style.SUCCESS(f'Successfully removed {deleted_count} movies. Kept {keep_count} most recent movies.')
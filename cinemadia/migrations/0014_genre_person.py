@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinemadia', '0013_movie_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('slug', models.SlugField(allow_unicode=True, max_length=60, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Janr',
+                'verbose_name_plural': 'Janrlar',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Person',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(allow_unicode=True, max_length=120, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Shaxs',
+                'verbose_name_plural': 'Shaxslar',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='cast',
+            field=models.ManyToManyField(blank=True, related_name='acted_in', to='cinemadia.person'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='directors',
+            field=models.ManyToManyField(blank=True, related_name='directed', to='cinemadia.person'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='genres',
+            field=models.ManyToManyField(blank=True, related_name='movies', to='cinemadia.genre'),
+        ),
+    ]
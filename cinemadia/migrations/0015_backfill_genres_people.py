@@ -0,0 +1,114 @@
+from django.db import migrations
+from django.utils.text import slugify
+
+# Frozen copy of cinemadia.catalog as it was when this migration was written
+GENRES = [
+    ('jangari', 'Jangari', ['action']),
+    ('drama', 'Drama', ['drama']),
+    ('komediya', 'Komediya', ['comedy']),
+    ('melodrama', 'Melodrama', ['romance', 'romantic']),
+    ('sarguzasht', 'Sarguzasht', ['adventure']),
+    ('qorquv', "Qo'rqinchli", ['horror']),
+    ('tarixiy', 'Tarixiy', ['history', 'historical']),
+    ('klassika', 'Klassika', ['classic']),
+    ('fantastika', 'Fantastika', ['sci-fi', 'science fiction']),
+    ('hayotiy', 'Hayotiy', ['biography']),
+    ('triller', 'Triller', ['thriller']),
+    ('detektiv', 'Detektiv', ['mystery', 'detective']),
+    ('hujjatli', 'Hujjatli', ['documentary']),
+    ('anime', 'Anime', ['anime']),
+    ('multfilm', 'Multfilm', ['animation']),
+    ('kriminal', 'Kriminal', ['crime']),
+    ('fentezi', 'Fentezi', ['fantasy']),
+    ('afsona', 'Afsona', ['mythology', 'legend']),
+    ('vester', 'Vester', ['western']),
+    ('musiqiy', 'Musiqiy', ['music', 'musical']),
+    ('oilaviy', 'Oilaviy', ['family']),
+    ('jangovar', 'Jangovar', ['war']),
+    ('sport', 'Sport', ['sport']),
+]
+
+GENRE_NAMES = {slug: name for slug, name, aliases in GENRES}
+
+GENRE_LOOKUP = {
+    alias.casefold(): slug
+    for slug, name, aliases in GENRES
+    for alias in [slug, name, *aliases]
+}
+
+
+def split_names(text):
+    names = []
+    for name in (text or '').split(','):
+        name = ' '.join(name.split())
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def genre_slug(name):
+    name = ' '.join(name.split())
+    return GENRE_LOOKUP.get(name.casefold()) or slugify(name, allow_unicode=True)
+
+
+def person_slug(name):
+    return slugify(name, allow_unicode=True)
+
+
+def backfill(apps, schema_editor):
+    Movie = apps.get_model('cinemadia', 'Movie')
+    Genre = apps.get_model('cinemadia', 'Genre')
+    Person = apps.get_model('cinemadia', 'Person')
+
+    movies = list(Movie.objects.values_list('id', 'genre', 'director', 'actors'))
+
+    genre_names = {}
+    person_names = {}
+    for movie_id, genre, director, actors in movies:
+        for name in split_names(genre):
+            slug = genre_slug(name)
+            genre_names.setdefault(slug, GENRE_NAMES.get(slug, name or slug))
+        for name in split_names(director) + split_names(actors):
+            person_names.setdefault(person_slug(name), name)
+    genre_names.pop('', None)
+    person_names.pop('', None)
+
+    Genre.objects.bulk_create(
+        [Genre(slug=slug, name=name) for slug, name in genre_names.items()],
+        ignore_conflicts=True,
+    )
+    Person.objects.bulk_create(
+        [Person(slug=slug, name=name) for slug, name in person_names.items()],
+        ignore_conflicts=True,
+    )
+    genre_ids = dict(Genre.objects.values_list('slug', 'id'))
+    person_ids = dict(Person.objects.values_list('slug', 'id'))
+
+    movie_genres = []
+    movie_directors = []
+    movie_cast = []
+    for movie_id, genre, director, actors in movies:
+        for slug in {genre_slug(name) for name in split_names(genre)}:
+            if slug in genre_ids:
+                movie_genres.append(Movie.genres.through(movie_id=movie_id, genre_id=genre_ids[slug]))
+        for slug in {person_slug(name) for name in split_names(director)}:
+            if slug in person_ids:
+                movie_directors.append(Movie.directors.through(movie_id=movie_id, person_id=person_ids[slug]))
+        for slug in {person_slug(name) for name in split_names(actors)}:
+            if slug in person_ids:
+                movie_cast.append(Movie.cast.through(movie_id=movie_id, person_id=person_ids[slug]))
+
+    Movie.genres.through.objects.bulk_create(movie_genres, batch_size=1000, ignore_conflicts=True)
+    Movie.directors.through.objects.bulk_create(movie_directors, batch_size=1000, ignore_conflicts=True)
+    Movie.cast.through.objects.bulk_create(movie_cast, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinemadia', '0014_genre_person'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:20
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, Least, NullIf
+
+
+def backfill(apps, schema_editor):
+    # The formula of cinemadia.popularity when this migration was written
+    Movie = apps.get_model('cinemadia', 'Movie')
+    likes = Cast(F('likes_count'), FloatField())
+    total = likes + Cast(F('dislikes_count'), FloatField())
+    Movie.objects.update(popularity_score=Coalesce(
+        likes * 100 / NullIf(total, Value(0.0)) + Least(total / 10, Value(50.0)),
+        Value(0.0),
+        output_field=FloatField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinemadia', '0015_backfill_genres_people'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='popularity_score',
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:21
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from django.db import migrations, models
+
+# cinemadia.trending's constants when this migration was written
+EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE = timedelta(days=3)
+VOTE_WEIGHT = 1.0
+FAVORITE_WEIGHT = 2.0
+WATCH_WEIGHT = 1.5
+
+
+def backfill(apps, schema_editor):
+    Movie = apps.get_model('cinemadia', 'Movie')
+    sources = [
+        (VOTE_WEIGHT, apps.get_model('cinemadia', 'MovieVote').objects.values_list('movie_id', 'created_at')),
+        (FAVORITE_WEIGHT, apps.get_model('cinemadia', 'Favorite').objects.values_list('movie_id', 'created_at')),
+        (WATCH_WEIGHT, apps.get_model('cinemadia', 'WatchHistory').objects.values_list('movie_id', 'watched_at')),
+    ]
+    scores = defaultdict(float)
+    for weight, rows in sources:
+        for movie_id, when in rows.iterator():
+            scores[movie_id] += weight * 2 ** ((when - EPOCH) / HALF_LIFE)
+    movies = [Movie(pk=movie_id, trending_score=score) for movie_id, score in scores.items()]
+    Movie.objects.bulk_update(movies, ['trending_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinemadia', '0016_movie_popularity_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='trending_score',
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinemadia', '0017_movie_trending_score'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['category', '-rating', '-year'], name='movie_category_rank_idx'),
+        ),
+    ]
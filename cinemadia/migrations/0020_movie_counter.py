@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:25
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill(apps, schema_editor):
+    # Keys as cinemadia.counters named them when this migration was written
+    Movie = apps.get_model('cinemadia', 'Movie')
+    MovieCounter = apps.get_model('cinemadia', 'MovieCounter')
+    counts = {'all': Movie.objects.count()}
+    for category, count in Movie.objects.order_by().values_list('category').annotate(Count('id')):
+        counts[f'category:{category}'] = count
+    genre_links = Movie.genres.through.objects.order_by().values_list('genre__slug')
+    for slug, count in genre_links.annotate(Count('id')):
+        counts[f'genre:{slug}'] = count
+    MovieCounter.objects.bulk_create([MovieCounter(key=key, count=count) for key, count in counts.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinemadia', '0019_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieCounter',
+            fields=[
+                ('key', models.CharField(max_length=80, primary_key=True, serialize=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Hisoblagich',
+                'verbose_name_plural': 'Hisoblagichlar',
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
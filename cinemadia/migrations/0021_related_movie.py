@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinemadia', '0020_movie_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedMovie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(default='content', max_length=20)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='cinemadia.movie')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='cinemadia.movie')),
+            ],
+            options={
+                'verbose_name': "O'xshash film",
+                'verbose_name_plural': "O'xshash filmlar",
+                'ordering': ['movie', 'source', 'rank'],
+                'indexes': [models.Index(fields=['movie', 'source', 'rank'], name='related_movie_rank_idx')],
+                'unique_together': {('movie', 'source', 'related')},
+            },
+        ),
+    ]
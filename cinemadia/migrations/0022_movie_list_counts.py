@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:49
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_per_movie(model):
+    rows = model.objects.filter(movie=OuterRef('pk')).order_by().values('movie').annotate(count=Count('pk'))
+    return Coalesce(Subquery(rows.values('count'), output_field=IntegerField()), 0)
+
+
+def backfill(apps, schema_editor):
+    apps.get_model('cinemadia', 'Movie').objects.update(
+        favorites_count=count_per_movie(apps.get_model('cinemadia', 'Favorite')),
+        watchlist_count=count_per_movie(apps.get_model('cinemadia', 'Watchlist')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinemadia', '0021_related_movie'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Sevimlilar'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='watchlist_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Ko'rish ro'yxati"),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('cinemadia', '0022_movie_list_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserFeed',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('movie_ids', models.JSONField(default=list)),
+                ('built_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Tavsiyalar lentasi',
+                'verbose_name_plural': 'Tavsiyalar lentalari',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinemadia', '0023_user_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeneration',
+            fields=[
+                ('name', models.CharField(max_length=80, primary_key=True, serialize=False)),
+                ('value', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Kesh avlodi',
+                'verbose_name_plural': 'Kesh avlodlari',
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cinemadia', '0024_cache_generation'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CacheGeneration',
+        ),
+    ]
@@ -1,9 +1,78 @@
+import logging
+
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
 
+from . import catalog, popularity
+
+logger = logging.getLogger(__name__)
+
+
+def _get_or_create_by_slug(model, names_by_slug):
+    """Fetch rows by slug, bulk-creating the missing ones in one query"""
+    existing = {obj.slug: obj for obj in model.objects.filter(slug__in=names_by_slug)}
+    missing = [
+        model(slug=slug, name=name)
+        for slug, name in names_by_slug.items() if slug not in existing
+    ]
+    if missing:
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        existing = {obj.slug: obj for obj in model.objects.filter(slug__in=names_by_slug)}
+    return list(existing.values())
+
+class Genre(models.Model):
+    """Movie genre, addressed by the Uzbek slug used in site URLs"""
+    name = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=60, unique=True, allow_unicode=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def resolve(cls, names):
+        """Return Genre rows for free-text names, creating missing ones"""
+        slugs = {}
+        for name in names:
+            slug = catalog.genre_slug(name)
+            if slug:
+                slugs.setdefault(slug, catalog.genre_name(slug, name))
+        return _get_or_create_by_slug(cls, slugs)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Janr'
+        verbose_name_plural = 'Janrlar'
+
+
+class Person(models.Model):
+    """Actor or director"""
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=120, unique=True, allow_unicode=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def resolve(cls, names):
+        """Return Person rows for free-text names, creating missing ones"""
+        slugs = {}
+        for name in names:
+            slug = catalog.person_slug(name)
+            if slug:
+                slugs.setdefault(slug, name)
+        return _get_or_create_by_slug(cls, slugs)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Shaxs'
+        verbose_name_plural = 'Shaxslar'
+
+
 class Movie(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
@@ -66,9 +135,20 @@ class Movie(models.Model):
     video_url = models.URLField(blank=True, null=True)
     trailer_url = models.URLField(blank=True, null=True)
     
+    # Normalized copies of genre/director/actors, rebuilt on save
+    genres = models.ManyToManyField(Genre, related_name='movies', blank=True)
+    directors = models.ManyToManyField(Person, related_name='directed', blank=True)
+    cast = models.ManyToManyField(Person, related_name='acted_in', blank=True)
+    
     # Like/Dislike fields
     likes_count = models.PositiveIntegerField(default=0)
     dislikes_count = models.PositiveIntegerField(default=0)
+    popularity_score = models.FloatField(default=0.0, db_index=True, editable=False)
+    # Forward-decayed recent activity, see cinemadia.trending
+    trending_score = models.FloatField(default=0.0, db_index=True, editable=False)
+    # Users with the movie in their lists, kept by signals
+    favorites_count = models.PositiveIntegerField('Sevimlilar', default=0, editable=False)
+    watchlist_count = models.PositiveIntegerField('Ko\'rish ro\'yxati', default=0, editable=False)
     
     # Timestamp fields
     created_at = models.DateTimeField(auto_now_add=True)
@@ -77,34 +157,88 @@ class Movie(models.Model):
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored category so counters can follow a change
+        if 'category' in field_names:
+            instance._stored_category = values[field_names.index('category')]
+        return instance
+    
     def get_poster(self):
         if self.poster_file:
             return self.poster_file.url
         return self.poster_url
     
     def get_popularity_score(self):
-        """Calculate popularity score based on likes, dislikes, and views"""
-        total_votes = self.likes_count + self.dislikes_count
-        if total_votes == 0:
-            return 0
-        
-        # Calculate percentage of likes
-        like_percentage = (self.likes_count / total_votes) * 100
-        
-        # Boost score based on total engagement
-        engagement_boost = min(total_votes / 10, 50)  # Max 50 point boost
-        
-        return like_percentage + engagement_boost
+        """Stored popularity score, see cinemadia.popularity"""
+        return self.popularity_score
+    
+    def add_votes(self, likes=0, dislikes=0):
+        """Shift the vote counts and recompute popularity in one UPDATE"""
+        likes_count = F('likes_count') + likes
+        dislikes_count = F('dislikes_count') + dislikes
+        shifted = Movie.objects.filter(
+            pk=self.pk, likes_count__gte=-likes, dislikes_count__gte=-dislikes,
+        ).update(
+            likes_count=likes_count,
+            dislikes_count=dislikes_count,
+            popularity_score=popularity.score_expression(likes_count, dislikes_count),
+        )
+        if not shifted and Movie.objects.filter(pk=self.pk).exists():
+            # The counts have drifted below the votes being removed; stop at
+            # zero so the row stays valid and leave the fix to
+            # reconcile_movie_counts
+            logger.warning(
+                'Vote counts of movie %s would drop below zero (likes %+d, dislikes %+d); '
+                'run reconcile_movie_counts', self.pk, likes, dislikes,
+            )
+            likes_count = Greatest(likes_count, 0)
+            dislikes_count = Greatest(dislikes_count, 0)
+            Movie.objects.filter(pk=self.pk).update(
+                likes_count=likes_count,
+                dislikes_count=dislikes_count,
+                popularity_score=popularity.score_expression(likes_count, dislikes_count),
+            )
+        self.refresh_from_db(fields=['likes_count', 'dislikes_count', 'popularity_score'])
+    
+    def sync_relations(self):
+        """Rebuild genre and people links from the comma-separated text fields"""
+        self.genres.set(Genre.resolve(catalog.split_names(self.genre)))
+        self.directors.set(Person.resolve(catalog.split_names(self.director)))
+        self.cast.set(Person.resolve(catalog.split_names(self.actors)))
+    
+    # Moved by F() updates from signals, votes and batch jobs; a full save
+    # of a stale instance must not write its copies back
+    COUNTER_FIELDS = (
+        'likes_count', 'dislikes_count', 'popularity_score', 'trending_score',
+        'favorites_count', 'watchlist_count',
+    )
     
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'likes_count', 'dislikes_count'} & set(update_fields):
+            # Written with the counts instead of by a second UPDATE
+            self.popularity_score = popularity.score(self.likes_count, self.dislikes_count)
+            if update_fields is not None:
+                kwargs['update_fields'] = [*update_fields, 'popularity_score']
         super().save(*args, **kwargs)
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Film'
         verbose_name_plural = 'Filmlar'
+        indexes = [
+            models.Index(fields=['category', '-rating', '-year', '-id'], name='movie_category_rank_idx'),
+            models.Index(fields=['-created_at', '-id'], name='movie_newest_idx'),
+        ]
 
 
 class UserProfile(models.Model):
@@ -129,6 +263,9 @@ class Favorite(models.Model):
     class Meta:
         unique_together = ['user', 'movie']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='favorite_user_newest_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.movie.title}"
@@ -143,6 +280,9 @@ class Watchlist(models.Model):
     class Meta:
         unique_together = ['user', 'movie']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='watchlist_user_newest_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} watchlist - {self.movie.title}"
@@ -202,4 +342,52 @@ class MovieVote(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.movie.title} ({self.vote_type})"
-   
\ No newline at end of file
+
+
+class MovieCounter(models.Model):
+    """Maintained movie counts, see cinemadia.counters"""
+    key = models.CharField(max_length=80, primary_key=True)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Hisoblagich'
+        verbose_name_plural = 'Hisoblagichlar'
+    
+    def __str__(self):
+        return f"{self.key}: {self.count}"
+
+
+class RelatedMovie(models.Model):
+    """Precomputed neighbours of a movie, see cinemadia.related"""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='related_to')
+    source = models.CharField(max_length=20, default='content')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['movie', 'source', 'related']
+        ordering = ['movie', 'source', 'rank']
+        indexes = [
+            models.Index(fields=['movie', 'source', 'rank'], name='related_movie_rank_idx'),
+        ]
+        verbose_name = 'O\'xshash film'
+        verbose_name_plural = 'O\'xshash filmlar'
+    
+    def __str__(self):
+        return f"{self.movie_id} -> {self.related_id} ({self.source} #{self.rank})"
+
+
+class UserFeed(models.Model):
+    """Precomputed home feed of a user, see cinemadia.feeds"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='feed')
+    movie_ids = models.JSONField(default=list)
+    built_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Tavsiyalar lentasi'
+        verbose_name_plural = 'Tavsiyalar lentalari'
+    
+    def __str__(self):
+        return f"{self.user_id}: {len(self.movie_ids)}"
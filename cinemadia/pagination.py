@@ -0,0 +1,126 @@
+"""Keyset (cursor) pagination for movie grids.
+
+Instead of ``OFFSET n`` plus a ``COUNT(*)``, each page continues from the
+sort key of the last row shown: ``WHERE (rating, year, id) < (...)``.
+Cursors are signed so they can't be forged into arbitrary filters, and
+every page costs the same as the first one.
+"""
+from django.core import signing
+from django.db.models import Q
+
+SALT = 'cinemadia.pagination'
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+# Sort keys used by the grids; each ends with the primary key so it is total
+BY_RATING = ('-rating', '-year', '-id')
+BY_NEWEST = ('-created_at', '-id')
+
+
+class KeysetPage:
+    """One page of results with opaque cursors to its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _fields(model, ordering):
+    return [(model._meta.get_field(name.lstrip('-')), name.startswith('-')) for name in ordering]
+
+
+def encode_cursor(direction, obj, ordering, model):
+    """Cursor for the sort key of ``obj``, a model instance or values() row"""
+    values = []
+    for field, descending in _fields(model, ordering):
+        value = obj[field.name] if isinstance(obj, dict) else getattr(obj, field.attname)
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return signing.dumps([direction, values], salt=SALT, compress=True)
+
+
+def decode_cursor(cursor, model, ordering):
+    """Return ``(direction, values)``, or None for a missing or bad cursor"""
+    if not cursor:
+        return None
+    try:
+        direction, values = signing.loads(cursor, salt=SALT)
+        fields = _fields(model, ordering)
+        if direction not in (NEXT, PREVIOUS) or len(values) != len(fields):
+            return None
+        return direction, [field.to_python(value) for (field, descending), value in zip(fields, values)]
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+
+
+def _after(fields, values, reverse=False):
+    """Rows that sort after ``values`` (or before them with ``reverse``)"""
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(fields, values):
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition |= equal & Q(**{f'{field.name}__{lookup}': value})
+        equal &= Q(**{field.name: value})
+    # The redundant bound on the leading column lets the database seek
+    # into the index instead of filtering every row before the cursor
+    (field, descending), value = fields[0], values[0]
+    lookup = 'lte' if descending != reverse else 'gte'
+    return condition & Q(**{f'{field.name}__{lookup}': value})
+
+
+def _reversed(ordering):
+    return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+
+def paginate(queryset, ordering, cursor=None, per_page=12):
+    """Return the KeysetPage of ``queryset`` sorted by ``ordering`` that
+    ``cursor`` points to, or the first page without a valid cursor.
+
+    ``values()`` querysets work too as long as they include the sort keys.
+    """
+    fields = _fields(queryset.model, ordering)
+    decoded = decode_cursor(cursor, queryset.model, ordering)
+    backwards = decoded is not None and decoded[0] == PREVIOUS
+    if decoded is None:
+        rows = queryset.order_by(*ordering)
+    elif backwards:
+        rows = queryset.filter(_after(fields, decoded[1], reverse=True)).order_by(*_reversed(ordering))
+    else:
+        rows = queryset.filter(_after(fields, decoded[1])).order_by(*ordering)
+
+    object_list = list(rows[:per_page + 1])
+    more = len(object_list) > per_page
+    object_list = object_list[:per_page]
+    if backwards:
+        object_list.reverse()
+    if not object_list:
+        return KeysetPage(object_list)
+
+    # Fetching one extra row tells whether there is a page beyond this one
+    if backwards:
+        has_next, has_previous = True, more
+    else:
+        has_next, has_previous = more, decoded is not None
+    return KeysetPage(
+        object_list,
+        next_cursor=encode_cursor(NEXT, object_list[-1], ordering, queryset.model) if has_next else None,
+        previous_cursor=encode_cursor(PREVIOUS, object_list[0], ordering, queryset.model) if has_previous else None,
+    )
@@ -0,0 +1,35 @@
+"""The one definition of a movie's popularity score.
+
+Popularity is the percentage of likes among all votes plus an engagement
+boost of one point per ten votes, capped at 50; movies without votes
+score 0. It is written to ``Movie.popularity_score`` by the database, so
+sorting by popularity is an index scan; ``score`` is the same formula for
+rows that are about to be saved.
+"""
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, Least, NullIf
+
+MAX_ENGAGEMENT_BOOST = 50.0
+
+
+def score_expression(likes=F('likes_count'), dislikes=F('dislikes_count')):
+    """Popularity for the given like/dislike count expressions.
+
+    Pass shifted counts such as ``F('likes_count') + 1`` to compute the
+    score of an ``UPDATE`` in the same statement as the counts.
+    """
+    total = Cast(likes, FloatField()) + Cast(dislikes, FloatField())
+    return Coalesce(
+        Cast(likes, FloatField()) * 100 / NullIf(total, Value(0.0))
+        + Least(total / 10, Value(MAX_ENGAGEMENT_BOOST)),
+        Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def score(likes, dislikes):
+    """Popularity for plain like/dislike counts"""
+    total = likes + dislikes
+    if not total:
+        return 0.0
+    return likes * 100 / total + min(total / 10, MAX_ENGAGEMENT_BOOST)
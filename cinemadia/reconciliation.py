@@ -0,0 +1,85 @@
+"""Recompute the denormalized vote counts and ratings of movies.
+
+likes_count and dislikes_count should equal the MovieVote rows, and the
+rating of a reviewed movie the rounded average of its reviews. The
+catalog is walked in primary-key ranges; each range is read in one short
+transaction with grouped aggregates and only the rows that drifted are
+written, in a second short transaction. Counts are corrected by adding
+the drift to the live column rather than overwriting it, so votes cast
+while the command runs are not lost.
+"""
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Q
+
+from . import popularity
+from .caching import bump_catalog_generation
+
+CHUNK_SIZE = 1000
+
+
+class Drift:
+    """What a reconciliation run found"""
+
+    def __init__(self):
+        self.movies = 0
+        self.changed = 0
+        self.likes = 0
+        self.dislikes = 0
+        self.ratings = 0
+        self.largest = 0
+        self.changed_ids = []
+
+
+def _read_chunk(start, stop):
+    from .models import Movie, MovieVote, Review
+
+    with transaction.atomic():
+        movies = list(Movie.objects.filter(pk__gte=start, pk__lt=stop).order_by('pk').only('id', 'likes_count', 'dislikes_count', 'rating'))
+        votes = {
+            row['movie_id']: row
+            for row in MovieVote.objects.filter(movie_id__gte=start, movie_id__lt=stop)
+            .order_by().values('movie_id')
+            .annotate(likes=Count('id', filter=Q(vote_type='like')), dislikes=Count('id', filter=Q(vote_type='dislike')))
+        }
+        ratings = dict(
+            Review.objects.filter(movie_id__gte=start, movie_id__lt=stop)
+            .order_by().values('movie_id').annotate(average=Avg('rating')).values_list('movie_id', 'average')
+        )
+    return movies, votes, ratings
+
+
+def reconcile_movies(chunk_size=CHUNK_SIZE, dry_run=False):
+    """Correct every drifted movie; returns a Drift with the totals"""
+    from .models import Movie
+
+    drift = Drift()
+    last = Movie.objects.aggregate(last=Max('pk'))['last'] or 0
+    for start in range(1, last + 1, chunk_size):
+        movies, votes, ratings = _read_chunk(start, start + chunk_size)
+        drift.movies += len(movies)
+        changed = []
+        for movie in movies:
+            counted = votes.get(movie.pk, {'likes': 0, 'dislikes': 0})
+            likes = counted['likes'] - movie.likes_count
+            dislikes = counted['dislikes'] - movie.dislikes_count
+            # Movies without reviews keep their editorial rating
+            rating = round(ratings[movie.pk], 1) if movie.pk in ratings else movie.rating
+            if not likes and not dislikes and rating == movie.rating:
+                continue
+            drift.likes += abs(likes)
+            drift.dislikes += abs(dislikes)
+            drift.ratings += rating != movie.rating
+            drift.largest = max(drift.largest, abs(likes), abs(dislikes))
+            drift.changed_ids.append(movie.pk)
+            movie.likes_count = F('likes_count') + likes
+            movie.dislikes_count = F('dislikes_count') + dislikes
+            movie.popularity_score = popularity.score_expression(movie.likes_count, movie.dislikes_count)
+            movie.rating = rating
+            changed.append(movie)
+        drift.changed += len(changed)
+        if changed and not dry_run:
+            with transaction.atomic():
+                Movie.objects.bulk_update(changed, ['likes_count', 'dislikes_count', 'popularity_score', 'rating'])
+    if drift.changed and not dry_run:
+        bump_catalog_generation()
+    return drift
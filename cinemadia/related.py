@@ -0,0 +1,276 @@
+"""Content-based related movies from TF-IDF vectors.
+
+Each movie becomes a sparse vector of weighted genre, director, actor and
+description terms. The batch job computes the top-k cosine neighbours of
+every movie and stores them in RelatedMovie, so the detail page reads its
+related movies with one indexed query. The fitted vocabulary, IDF weights
+and matrix are saved to RELATED_INDEX_PATH so a single edited movie can be
+re-ranked against the catalog without refitting.
+"""
+import os
+import pickle
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import cards, catalog
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # related movies are only computed where SciPy is installed
+    np = sparse = None
+
+SOURCE = 'content'
+
+# Neighbours stored per movie
+TOP_K = 12
+
+# Term weights per field: sharing a director says more than sharing a word
+FIELD_WEIGHTS = {'g': 2.0, 'd': 3.0, 'a': 1.5, 'w': 1.0}
+
+# Description words found in more than this share of movies are dropped,
+# like stop words: they link nearly everything to everything
+MAX_WORD_FREQUENCY = 0.05
+
+# Rows multiplied against the whole matrix at once in the batch job
+CHUNK_SIZE = 512
+
+WORD_RE = re.compile(r'[^\W\d_]{3,}')
+
+STOP_WORDS = frozenset(
+    'the and for with his her their from that this into who when while after '
+    'one two they them has have are was were its but not all out about must '
+    'bir va bilan uchun ham esa bu shu u ular'.split()
+)
+
+FIELDS = ('id', 'genre', 'director', 'actors', 'description')
+
+
+def terms(genre, director, actors, description):
+    """Field-prefixed terms and their counts for one movie"""
+    counts = Counter()
+    for name in catalog.split_names(genre):
+        counts[f'g:{catalog.genre_slug(name)}'] += 1
+    for name in catalog.split_names(director):
+        counts[f'd:{catalog.person_slug(name)}'] += 1
+    for name in catalog.split_names(actors):
+        counts[f'a:{catalog.person_slug(name)}'] += 1
+    for word in WORD_RE.findall((description or '').casefold()):
+        if word not in STOP_WORDS:
+            counts[f'w:{word}'] += 1
+    return counts
+
+
+def top_neighbours(movie_ids, columns, values, exclude, k):
+    """Best ``k`` (movie id, score) pairs from one sparse row of scores,
+    where ``columns`` index into ``movie_ids``; ties go to the lower id."""
+    keep = (movie_ids[columns] != exclude) & (values > 0)
+    columns, values = columns[keep], values[keep]
+    if len(values) > k:
+        best = np.argpartition(-values, k)[:k]
+        columns, values = columns[best], values[best]
+    order = np.lexsort((movie_ids[columns], -values))
+    return [(int(movie_ids[columns[i]]), float(values[i])) for i in order]
+
+
+def weighted_rows(documents, vocabulary, idf):
+    """CSR matrix of L2-normalized TF-IDF rows for ``documents``"""
+    indptr = [0]
+    indices = []
+    data = []
+    for counts in documents:
+        for term, count in counts.items():
+            column = vocabulary.get(term)
+            if column is None:
+                continue
+            indices.append(column)
+            # Sublinear term frequency keeps long descriptions in check
+            data.append((1 + np.log(count)) * idf[column] * FIELD_WEIGHTS[term[0]])
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), indptr),
+        shape=(len(documents), len(vocabulary)),
+    )
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+class RelatedIndex:
+    """Fitted vocabulary, IDF weights and the normalized movie matrix"""
+
+    def __init__(self, movie_ids, vocabulary, idf, matrix):
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.matrix = matrix
+        self._transposed = None
+
+    @classmethod
+    def fit(cls, rows):
+        """Build from ``(id, genre, director, actors, description)`` rows"""
+        movie_ids = []
+        documents = []
+        for movie_id, genre, director, actors, description in rows:
+            movie_ids.append(movie_id)
+            documents.append(terms(genre, director, actors, description))
+        frequency = Counter()
+        for counts in documents:
+            frequency.update(counts.keys())
+        # Terms found in a single movie can't relate it to anything
+        max_words = max(2, MAX_WORD_FREQUENCY * len(documents))
+        vocabulary = {}
+        for term, count in frequency.items():
+            if count > 1 and (term[0] != 'w' or count <= max_words):
+                vocabulary[term] = len(vocabulary)
+        document_frequency = np.zeros(len(vocabulary), dtype=np.float32)
+        for term, column in vocabulary.items():
+            document_frequency[column] = frequency[term]
+        idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+        return cls(movie_ids, vocabulary, idf, weighted_rows(documents, vocabulary, idf))
+
+    @property
+    def transposed(self):
+        if self._transposed is None:
+            self._transposed = self.matrix.T.tocsr()
+        return self._transposed
+
+    def vectorize(self, genre, director, actors, description):
+        return weighted_rows([terms(genre, director, actors, description)], self.vocabulary, self.idf)
+
+    def neighbours(self, k=TOP_K):
+        """Yield ``(movie id, [(related id, score), ...])`` for every movie"""
+        transposed = self.transposed
+        for start in range(0, self.matrix.shape[0], CHUNK_SIZE):
+            scores = (self.matrix[start:start + CHUNK_SIZE] @ transposed).tocsr()
+            for offset in range(scores.shape[0]):
+                movie_id = self.movie_ids[start + offset]
+                begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+                yield int(movie_id), top_neighbours(
+                    self.movie_ids, scores.indices[begin:end], scores.data[begin:end], movie_id, k
+                )
+
+    def neighbours_of(self, movie_id, vector, k=TOP_K):
+        scores = (vector @ self.transposed).tocsr()
+        return top_neighbours(self.movie_ids, scores.indices, scores.data, movie_id, k)
+
+    def save(self, path):
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as handle:
+            pickle.dump(
+                {
+                    'movie_ids': self.movie_ids,
+                    'vocabulary': self.vocabulary,
+                    'idf': self.idf,
+                    'matrix': self.matrix,
+                },
+                handle,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as handle:
+            data = pickle.load(handle)
+        return cls(data['movie_ids'], data['vocabulary'], data['idf'], data['matrix'])
+
+
+_index = None
+_load_lock = threading.Lock()
+
+
+def is_available():
+    return np is not None
+
+
+def get_index():
+    """The saved index, loaded once per process; None if never built"""
+    global _index
+    if _index is None and is_available() and os.path.exists(settings.RELATED_INDEX_PATH):
+        with _load_lock:
+            if _index is None:
+                _index = RelatedIndex.load(settings.RELATED_INDEX_PATH)
+    return _index
+
+
+def store(pairs, source=SOURCE, computed_at=None, batch_size=5000, k=None):
+    """Replace the ``source`` neighbours of the movies in ``pairs``, each
+    batch in its own short transaction. Movies deleted since the index was
+    built are dropped, and at most ``k`` neighbours are kept per movie."""
+    from .models import Movie, RelatedMovie
+
+    computed_at = computed_at or timezone.now()
+    pending = []
+    size = 0
+
+    def flush():
+        ids = {movie_id for movie_id, neighbours in pending}
+        ids.update(related_id for movie_id, neighbours in pending for related_id, score in neighbours)
+        with transaction.atomic():
+            existing = set(Movie.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            RelatedMovie.objects.filter(source=source, movie_id__in=[movie_id for movie_id, _ in pending]).delete()
+            batch = []
+            for movie_id, neighbours in pending:
+                if movie_id not in existing:
+                    continue
+                neighbours = [(related_id, score) for related_id, score in neighbours if related_id in existing]
+                batch.extend(
+                    RelatedMovie(
+                        movie_id=movie_id, related_id=related_id, source=source,
+                        rank=rank, score=score, computed_at=computed_at,
+                    )
+                    for rank, (related_id, score) in enumerate(neighbours[:k])
+                )
+            RelatedMovie.objects.bulk_create(batch)
+        pending.clear()
+
+    for movie_id, neighbours in pairs:
+        pending.append((movie_id, neighbours))
+        size += len(neighbours)
+        if size >= batch_size:
+            flush()
+            size = 0
+    if pending:
+        flush()
+
+
+def rebuild(k=TOP_K):
+    """Fit the index on the whole catalog and store every movie's neighbours"""
+    global _index
+    from .models import Movie, RelatedMovie
+
+    started = timezone.now()
+    index = RelatedIndex.fit(Movie.objects.values_list(*FIELDS).iterator())
+    # Chunks are written as they are computed, so the write lock is only
+    # held briefly; rows this run did not rewrite belong to gone movies
+    store(index.neighbours(k), computed_at=started)
+    RelatedMovie.objects.filter(source=SOURCE, computed_at__lt=started).delete()
+    index.save(settings.RELATED_INDEX_PATH)
+    _index = index
+    return len(index.movie_ids)
+
+
+def refresh_movie(movie, k=TOP_K):
+    """Re-rank one movie against the saved index and replace only its rows"""
+    index = get_index()
+    if index is None:
+        return False
+    vector = index.vectorize(movie.genre, movie.director, movie.actors, movie.description)
+    # The saved index may still hold movies deleted since it was built;
+    # store() drops them, so rank a few extra to keep ``k``
+    store([(movie.pk, index.neighbours_of(movie.pk, vector, k * 2))], k=k)
+    return True
+
+
+def related_cards(movie, limit=6, source=SOURCE):
+    """Cards for the stored neighbours of ``movie``, best first"""
+    from .models import RelatedMovie
+
+    links = RelatedMovie.objects.filter(movie=movie, source=source).order_by('rank')
+    return cards.to_cards(cards.card_values(links, 'related__')[:limit], 'related__')
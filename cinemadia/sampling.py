@@ -0,0 +1,53 @@
+"""Random movie picks drawn from random primary keys.
+
+``ORDER BY RANDOM()`` sorts the whole movie table on every call. Instead
+ids are drawn uniformly from the range between the smallest and largest
+primary key and only the rows that exist are kept, which is uniform over
+the movies that are left. Both ends of the range come from the primary
+key index, so a draw costs a few indexed lookups whatever the table size,
+and there is no pool to go stale when movies are added or deleted.
+"""
+import random
+
+from django.db.models import Max, Min
+
+from . import cards, counters
+
+# Extra ids drawn per round to make up for gaps left by deleted movies
+OVERSAMPLE = 1.5
+MAX_ROUNDS = 4
+
+
+def random_ids(count):
+    """Up to ``count`` distinct movie ids chosen uniformly at random"""
+    from .models import Movie
+
+    bounds = Movie.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    low, high = bounds['low'], bounds['high']
+    span = high - low + 1
+    # Share of the range still taken by movies, from the maintained counter
+    density = min(max(counters.total(), 1) / span, 1.0)
+    chosen = []
+    seen = set()
+    for _ in range(MAX_ROUNDS):
+        need = count - len(chosen)
+        if need <= 0 or len(seen) >= span:
+            break
+        size = min(int(need / density * OVERSAMPLE) + 1, span)
+        draw = set(random.sample(range(low, high + 1), size)) - seen
+        seen |= draw
+        found = list(Movie.objects.filter(id__in=draw).values_list('id', flat=True))
+        random.shuffle(found)
+        chosen.extend(found[:need])
+    return chosen
+
+
+def random_movies(count):
+    """Cards for up to ``count`` distinct movies chosen uniformly at random.
+
+    Ids of movies deleted between the draw and the card query are
+    skipped, so such a draw may come up short.
+    """
+    return cards.cards_by_id(random_ids(count))
@@ -0,0 +1,200 @@
+"""Full-text search over the movie catalog backed by an SQLite FTS5 index"""
+import re
+
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import cards, fuzzy
+from .caching import make_key
+
+FTS_TABLE = 'cinemadia_movie_fts'
+
+# Movie columns copied into the index, in FTS column order
+INDEXED_FIELDS = ('title', 'description', 'genre', 'director', 'actors')
+
+# bm25() weight per column: a title hit outranks a description hit
+COLUMN_WEIGHTS = (10.0, 1.0, 4.0, 5.0, 3.0)
+
+MAX_RESULTS = 1000
+SNIPPET_TOKENS = 16
+
+# Control characters used as highlight markers so snippets can be escaped
+# before the <mark> tags are put back in
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_available = None
+
+
+def create_index(conn=connection):
+    """Create the FTS5 table if needed and (re)fill it from the movie table"""
+    global _available
+    _available = None
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{', '.join(INDEXED_FIELDS)}, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    return rebuild(conn)
+
+
+def drop_index(conn=connection):
+    global _available
+    _available = None
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def is_available():
+    """Return True when the FTS5 table exists on the default database"""
+    global _available
+    if _available is None:
+        _available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _available
+
+
+def rebuild(conn=connection):
+    """Re-index every movie; returns the number of indexed rows"""
+    columns = ', '.join(INDEXED_FIELDS)
+    with conn.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, {columns}) '
+            f'SELECT id, {columns} FROM cinemadia_movie'
+        )
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def index_movie(movie):
+    if not is_available():
+        return
+    placeholders = ', '.join(['%s'] * (len(INDEXED_FIELDS) + 1))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [movie.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(INDEXED_FIELDS)}) VALUES ({placeholders})",
+            [movie.pk] + [getattr(movie, field) or '' for field in INDEXED_FIELDS],
+        )
+
+
+def remove_movie(movie_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [movie_id])
+
+
+def normalize_query(query):
+    """Canonical form of a user query: case-folded, trimmed and
+    transliterated to Latin. Cache keys and the trigram fallback use it;
+    the index itself is searched with the query as typed."""
+    return ' '.join(fuzzy.transliterate(query).split())
+
+
+def build_match_expression(query):
+    """Turn free user input into a safe FTS5 MATCH expression.
+
+    Every word is quoted so FTS5 operators typed by users are taken
+    literally, and the last word is matched as a prefix so partially
+    typed queries still find results.
+    """
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return ''
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_ids(query, limit=MAX_RESULTS):
+    """Return movie ids matching ``query``, best BM25 score first"""
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _render_highlight(text):
+    html = escape(text)
+    html = html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+    return mark_safe(html)
+
+
+def highlights(query, ids):
+    """Return ``{movie_id: (title_html, snippet_html)}`` for the given ids"""
+    expression = build_match_expression(query)
+    if not expression or not ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(ids))
+    description_column = INDEXED_FIELDS.index('description')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, '
+            f'highlight({FTS_TABLE}, 0, %s, %s), '
+            f"snippet({FTS_TABLE}, {description_column}, %s, %s, '…', {SNIPPET_TOKENS}) "
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})',
+            [HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END, expression, *ids],
+        )
+        return {
+            row[0]: (_render_highlight(row[1]), _render_highlight(row[2]))
+            for row in cursor.fetchall()
+        }
+
+
+def result_ids(query):
+    """Ordered ids of every movie matching ``query``.
+
+    The index is searched with the case-folded query, so Cyrillic input
+    matches Cyrillic text; when that finds nothing, typo- and
+    script-tolerant trigram matching runs on the normalized query.
+    Results are cached per normalized query in the ``search`` cache under
+    the catalog generation, so any movie write invalidates them.
+    """
+    from .models import Movie
+
+    normalized = normalize_query(query)
+    key = make_key('search', normalized)
+    search_cache = caches['search']
+    ids = search_cache.get(key)
+    if ids is None:
+        folded = ' '.join(query.casefold().split())
+        if is_available():
+            ids = search_ids(folded)
+        else:
+            ids = list(
+                Movie.objects.filter(
+                    Q(title__icontains=folded) |
+                    Q(description__icontains=folded) |
+                    Q(genre__icontains=folded) |
+                    Q(director__icontains=folded) |
+                    Q(actors__icontains=folded)
+                ).order_by('-rating', '-year').values_list('id', flat=True)
+            )
+        ids = ids or fuzzy.search_ids(normalized)
+        search_cache.set(key, ids)
+    return ids
+
+
+def fetch_movies(ids, query=''):
+    """Load movie cards for ``ids`` in the same order, with search highlights attached"""
+    movies = cards.cards_by_id(ids)
+    marks = highlights(query, [movie.id for movie in movies]) if query and is_available() else {}
+    for movie in movies:
+        movie.title_highlight, movie.search_snippet = marks.get(movie.id, (None, None))
+    return movies
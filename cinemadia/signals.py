@@ -0,0 +1,153 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import autocomplete, counters, embeddings, feeds, fuzzy, related, search, spelling, trending, user_state
+from .caching import ACTIVITY, bump_catalog_generation, bump_generation
+from .models import Favorite, Genre, Movie, MovieCounter, MovieVote, Review, UserProfile, WatchHistory, Watchlist
+
+
+def _touches(update_fields, fields):
+    """False only when a save explicitly wrote none of ``fields``"""
+    return update_fields is None or bool(set(update_fields) & set(fields))
+
+
+@receiver(post_save, sender=Movie)
+def movie_saved(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    bump_catalog_generation()
+    if created:
+        counters.adjust({counters.TOTAL: 1, counters.category_key(instance.category): 1})
+    elif _touches(update_fields, ('category',)):
+        stored = getattr(instance, '_stored_category', None)
+        if stored is not None and stored != instance.category:
+            counters.adjust({
+                counters.category_key(stored): -1,
+                counters.category_key(instance.category): 1,
+            })
+    instance._stored_category = instance.category
+    if _touches(update_fields, ('genre', 'director', 'actors')):
+        instance.sync_relations()
+    if _touches(update_fields, search.INDEXED_FIELDS):
+        search.index_movie(instance)
+    if _touches(update_fields, ('title', 'director')):
+        transaction.on_commit(lambda: fuzzy.movie_saved(instance))
+    if _touches(update_fields, ('slug', 'title', 'director', 'actors')):
+        transaction.on_commit(lambda: autocomplete.movie_saved(instance))
+    if _touches(update_fields, ('title', 'director', 'actors')):
+        transaction.on_commit(lambda: spelling.movie_saved(instance))
+    if _touches(update_fields, ('genre', 'director', 'actors', 'description')):
+        transaction.on_commit(lambda: related.refresh_movie(instance))
+        transaction.on_commit(lambda: embeddings.movie_saved(instance))
+
+
+@receiver(pre_delete, sender=Movie)
+def movie_deleting(sender, instance, **kwargs):
+    # Genre links are cascade-deleted without m2m_changed, so count them now
+    if counters.is_paused():
+        return
+    deltas = {counters.TOTAL: -1, counters.category_key(instance.category): -1}
+    for slug in instance.genres.values_list('slug', flat=True):
+        deltas[counters.genre_key(slug)] = -1
+    counters.adjust(deltas)
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def movie_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if counters.is_paused() or action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    sign = 1 if action == 'post_add' else -1
+    if reverse:
+        # ``instance`` is a genre and ``pk_set`` holds movie ids
+        linked = len(pk_set) if pk_set is not None else instance.movies.count()
+        counters.adjust({counters.genre_key(instance.slug): sign * linked})
+    else:
+        genres = instance.genres.all() if pk_set is None else Genre.objects.filter(pk__in=pk_set)
+        counters.adjust({
+            counters.genre_key(slug): sign for slug in genres.values_list('slug', flat=True)
+        })
+
+
+@receiver(pre_delete, sender=Genre)
+def genre_deleting(sender, instance, **kwargs):
+    MovieCounter.objects.filter(key=counters.genre_key(instance.slug)).delete()
+
+
+@receiver(post_delete, sender=Movie)
+def movie_deleted(sender, instance, **kwargs):
+    movie_id = instance.pk
+    bump_catalog_generation()
+    search.remove_movie(movie_id)
+    transaction.on_commit(lambda: autocomplete.movie_deleted(movie_id))
+    transaction.on_commit(lambda: fuzzy.movie_deleted(movie_id))
+    transaction.on_commit(lambda: embeddings.movie_deleted(movie_id))
+
+
+@receiver(post_save, sender=MovieVote)
+@receiver(post_delete, sender=MovieVote)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def activity_changed(sender, raw=False, **kwargs):
+    # Bulk jobs bump the generation once, when done
+    if not raw and not counters.is_paused():
+        bump_generation(ACTIVITY)
+
+
+@receiver(post_save, sender=MovieVote)
+def vote_trending(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        trending.record(instance.movie_id, trending.VOTE, instance.created_at)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_trending(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        trending.record(instance.movie_id, trending.FAVORITE, instance.created_at)
+
+
+@receiver(post_save, sender=WatchHistory)
+def watch_trending(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        trending.record(instance.movie_id, trending.WATCH, instance.watched_at)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=Watchlist)
+@receiver(post_delete, sender=Watchlist)
+@receiver(post_save, sender=MovieVote)
+@receiver(post_delete, sender=MovieVote)
+@receiver(post_save, sender=WatchHistory)
+@receiver(post_save, sender=UserProfile)
+def taste_changed(sender, instance, raw=False, **kwargs):
+    # Bulk jobs invalidate the users they touched once, when done
+    if not raw and not counters.is_paused():
+        feeds.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=Watchlist)
+@receiver(post_delete, sender=Watchlist)
+@receiver(post_save, sender=MovieVote)
+@receiver(post_delete, sender=MovieVote)
+def user_state_changed(sender, instance, raw=False, **kwargs):
+    if not raw and not counters.is_paused():
+        user_state.invalidate(instance.user_id)
+
+
+LIST_COUNT_FIELDS = {Favorite: 'favorites_count', Watchlist: 'watchlist_count'}
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Watchlist)
+def list_entry_saved(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_list_count(LIST_COUNT_FIELDS[sender], instance.movie_id, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Watchlist)
+def list_entry_deleted(sender, instance, **kwargs):
+    counters.shift_list_count(LIST_COUNT_FIELDS[sender], instance.movie_id, -1)
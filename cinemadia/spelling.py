@@ -0,0 +1,224 @@
+"""Symmetric-delete ("SymSpell") spelling suggestions for empty searches.
+
+Every catalog word is stored under each string reachable from its prefix
+by deleting up to MAX_EDIT_DISTANCE characters. A misspelled word only
+needs its own deletes looked up to find every candidate within that
+distance, so a lookup costs the same however large the catalog grows.
+
+Words are indexed in the normalized form search keys use, so Cyrillic
+and Latin spellings meet. The index is saved to SPELLING_INDEX_PATH by
+rebuild_spelling_index, which is meant to run periodically; every process
+reloads the file when it changes. In between, saving a movie adds the
+words the index does not know yet to the index of the saving process
+only, so imports never rewrite the file.
+"""
+import os
+import pickle
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+from . import search
+
+# Largest edit distance a suggestion may be from the typed word
+MAX_EDIT_DISTANCE = 2
+
+# Only this many leading characters are expanded into deletes; it keeps
+# the dictionary small without losing suggestions for long words
+PREFIX_LENGTH = 7
+
+# Shorter words are too ambiguous to correct
+MIN_WORD_LENGTH = 3
+
+WORD_RE = re.compile(r'[^\W\d_]+')
+
+# Query words the search takes literally that must not be "corrected"
+KEEP_WORDS = frozenset({'and', 'or', 'not', 'near'})
+
+
+def words(text):
+    return [
+        word for word in WORD_RE.findall(search.normalize_query(text or ''))
+        if len(word) >= MIN_WORD_LENGTH
+    ]
+
+
+def _deletes(word, distance=MAX_EDIT_DISTANCE):
+    """``word`` plus every string made by deleting up to ``distance`` characters"""
+    found = {word}
+    edge = {word}
+    for _ in range(distance):
+        edge = {item[:i] + item[i + 1:] for item in edge if len(item) > 1 for i in range(len(item))}
+        found |= edge
+    return found
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or ``limit + 1`` once it is exceeded"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SpellingIndex:
+    """Word frequencies plus the delete -> words map built from them"""
+
+    def __init__(self):
+        self._counts = {}
+        self._deletes = {}
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def load(self, texts):
+        """Replace the index with the words found in ``texts``"""
+        counts = defaultdict(int)
+        for text in texts:
+            for word in words(text):
+                counts[word] += 1
+        deletes = defaultdict(list)
+        for word in counts:
+            for key in _deletes(word[:PREFIX_LENGTH]):
+                deletes[key].append(word)
+        with self._lock:
+            self._counts = dict(counts)
+            self._deletes = dict(deletes)
+            self.loaded = True
+
+    def add(self, text):
+        """Add the words of ``text`` the index does not know yet; returns
+        how many were added. Known words keep their frequency, so saving
+        the same movie again changes nothing."""
+        added = 0
+        with self._lock:
+            for word in words(text):
+                if word in self._counts:
+                    continue
+                for key in _deletes(word[:PREFIX_LENGTH]):
+                    self._deletes.setdefault(key, []).append(word)
+                self._counts[word] = 1
+                added += 1
+        return added
+
+    def save(self, path):
+        with self._lock:
+            data = {'counts': self._counts, 'deletes': self._deletes}
+        # Per process, so workers building at the same time never share it
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as handle:
+            pickle.dump(data, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+
+    def load_file(self, path):
+        with open(path, 'rb') as handle:
+            data = pickle.load(handle)
+        with self._lock:
+            self._counts = data['counts']
+            self._deletes = data['deletes']
+            self.loaded = True
+
+    def lookup(self, word):
+        """Return the closest, most frequent known word, or None"""
+        if word in self._counts:
+            return word
+        candidates = set()
+        with self._lock:
+            for key in _deletes(word[:PREFIX_LENGTH]):
+                candidates.update(self._deletes.get(key, ()))
+            best = None
+            for candidate in candidates:
+                distance = edit_distance(word, candidate, MAX_EDIT_DISTANCE)
+                if distance > MAX_EDIT_DISTANCE:
+                    continue
+                rank = (distance, -self._counts[candidate], candidate)
+                if best is None or rank < best:
+                    best = rank
+        return best[2] if best else None
+
+    def correct(self, query):
+        """Return ``query`` with misspelled words replaced, or None if
+        nothing could be corrected."""
+        tokens = ' '.join(query.casefold().split()).split(' ')
+        corrected = []
+        for token in tokens:
+            if len(token) >= MIN_WORD_LENGTH and token not in KEEP_WORDS and WORD_RE.fullmatch(token):
+                corrected.append(self.lookup(token) or token)
+            else:
+                corrected.append(token)
+        if corrected == tokens:
+            return None
+        return ' '.join(corrected)
+
+
+index = SpellingIndex()
+_load_lock = threading.Lock()
+
+# Modification time of the file the index was last read from or written to
+_version = None
+
+
+def _file_version():
+    try:
+        return os.stat(settings.SPELLING_INDEX_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def catalog_texts():
+    from .models import Movie
+
+    for row in Movie.objects.values_list('title', 'director', 'actors').iterator():
+        yield from row
+
+
+def rebuild():
+    """Rebuild the index from the movie table and write it to disk"""
+    global _version
+    index.load(catalog_texts())
+    index.save(settings.SPELLING_INDEX_PATH)
+    _version = _file_version()
+    return len(index._counts)
+
+
+def load_from_disk():
+    """Load the saved index if there is one; called at worker start and
+    whenever another process has written it"""
+    global _version
+    version = _file_version()
+    if version is not None:
+        index.load_file(settings.SPELLING_INDEX_PATH)
+        _version = version
+
+
+def get_index():
+    """Return the process-wide index, building it if nothing was saved"""
+    if not index.loaded or _file_version() != _version:
+        with _load_lock:
+            if not index.loaded:
+                rebuild()
+            elif _file_version() != _version:
+                load_from_disk()
+    return index
+
+
+def suggest(query):
+    return get_index().correct(search.normalize_query(query))
+
+
+def movie_saved(movie):
+    if index.loaded:
+        for text in (movie.title, movie.director, movie.actors):
+            index.add(text)
@@ -1,3 +1,411 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+import threading
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import autocomplete, fuzzy, pagination, related, spelling, writebehind
+from .models import Favorite, Movie, MovieVote
+from .views import vote_movie
+
+
+@override_settings(WRITE_BEHIND_ENABLED=False)
+class ConcurrentVoteTests(TransactionTestCase):
+    """Vote counts stay equal to the MovieVote rows under parallel votes"""
+
+    THREADS = 8
+    VOTES_PER_THREAD = 250
+    USERS = 40
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('threads need a file test database')
+        self.movie = Movie.objects.create(
+            title='Premyera', slug='premyera', description='Test', year=2025,
+            director='Rejissor', actors='Aktyor', genre='Drama',
+        )
+        self.users = [User.objects.create_user(f'voter{i}') for i in range(self.USERS)]
+
+    def cast_votes(self, seed, errors):
+        factory = RequestFactory()
+        rng = random.Random(seed)
+        try:
+            for _ in range(self.VOTES_PER_THREAD):
+                request = factory.post('/', {'vote_type': rng.choice(['like', 'dislike'])})
+                request.user = rng.choice(self.users)
+                response = vote_movie(request, self.movie.id)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def test_parallel_votes_keep_counts_exact(self):
+        errors = []
+        threads = [
+            threading.Thread(target=self.cast_votes, args=(seed, errors))
+            for seed in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.movie.refresh_from_db()
+        votes = MovieVote.objects.filter(movie=self.movie)
+        self.assertEqual(self.movie.likes_count, votes.filter(vote_type='like').count())
+        self.assertEqual(self.movie.dislikes_count, votes.filter(vote_type='dislike').count())
+
+
+class WriteBehindTests(TransactionTestCase):
+    """Buffered clicks reach the database with exact counts, even after a crash"""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('the flush thread needs a file test database')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(WRITE_BEHIND_ENABLED=True, WRITE_BEHIND_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        buffer = mock.patch.object(writebehind, '_buffer', None)
+        buffer.start()
+        self.addCleanup(buffer.stop)
+        # Buffers of the test would otherwise flush at interpreter exit
+        exit_hook = mock.patch.object(writebehind, 'atexit')
+        exit_hook.start()
+        self.addCleanup(exit_hook.stop)
+        self.movie = Movie.objects.create(
+            title='Premyera', slug='premyera', description='Test', year=2025,
+            director='Rejissor', actors='Aktyor', genre='Drama',
+        )
+        self.users = [User.objects.create_user(f'voter{i}') for i in range(20)]
+
+    def test_buffered_votes_keep_counts_exact(self):
+        factory = RequestFactory()
+
+        def cast_votes(seed):
+            rng = random.Random(seed)
+            for _ in range(200):
+                request = factory.post('/', {'vote_type': rng.choice(['like', 'dislike'])})
+                request.user = rng.choice(self.users)
+                vote_movie(request, self.movie.id)
+            connection.close()
+
+        threads = [threading.Thread(target=cast_votes, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # The last answer projects the counts the flush will write
+        request = factory.post('/', {'vote_type': 'like'})
+        request.user = self.users[0]
+        projected = vote_movie(request, self.movie.id)
+        writebehind.flush()
+
+        self.movie.refresh_from_db()
+        votes = MovieVote.objects.filter(movie=self.movie)
+        self.assertEqual(self.movie.likes_count, votes.filter(vote_type='like').count())
+        self.assertEqual(self.movie.dislikes_count, votes.filter(vote_type='dislike').count())
+        self.assertJSONEqual(projected.content, {
+            'success': True,
+            'likes_count': self.movie.likes_count,
+            'dislikes_count': self.movie.dislikes_count,
+            'user_vote': votes.filter(user=self.users[0]).values_list('vote_type', flat=True).first(),
+        })
+
+    def test_journal_of_dead_process_is_replayed(self):
+        with mock.patch.object(writebehind.WriteBehindBuffer, 'start'):
+            buffer = writebehind.get_buffer()
+            writebehind.toggle(writebehind.FAVORITE, self.users[0], self.movie)
+            writebehind.toggle(writebehind.FAVORITE, self.users[1], self.movie)
+            writebehind.toggle(writebehind.FAVORITE, self.users[1], self.movie)
+            writebehind.vote(self.users[0], self.movie, 'like')
+        self.assertFalse(Favorite.objects.exists())
+
+        # The process dies without flushing; its lock is released
+        buffer._lock_handle.close()
+        self.assertEqual(writebehind.replay_orphans(), 3)
+        # Replaying is idempotent
+        self.assertEqual(writebehind.replay_orphans(), 0)
+
+        self.assertEqual(list(Favorite.objects.values_list('user', flat=True)), [self.users[0].id])
+        self.movie.refresh_from_db()
+        self.assertEqual((self.movie.likes_count, self.movie.dislikes_count), (1, 0))
+
+
+@override_settings(WRITE_BEHIND_ENABLED=False)
+class BulkListTests(TestCase):
+    """Bulk favorites sync in a fixed number of queries with exact counts"""
+
+    def setUp(self):
+        self.movies = [
+            Movie.objects.create(
+                title=f'Film {i}', slug=f'film-{i}', description='Test', year=2025,
+                director='Rejissor', actors='Aktyor', genre='Drama',
+            )
+            for i in range(200)
+        ]
+        self.user = User.objects.create_user('sync')
+        self.other = User.objects.create_user('other')
+        Favorite.objects.create(user=self.user, movie=self.movies[0])
+        Favorite.objects.create(user=self.other, movie=self.movies[0])
+        self.client.force_login(self.user)
+
+    def test_bulk_add_and_remove(self):
+        ids = [movie.id for movie in self.movies]
+        body = json.dumps({'add': ids[1:], 'remove': [ids[0], 99999]})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/favorites/bulk/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(queries), 15)
+        results = response.json()['results']
+        self.assertFalse(results[str(ids[0])])
+        self.assertTrue(all(results[str(movie_id)] for movie_id in ids[1:]))
+        self.assertEqual(response.json()['unknown'], [99999])
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 199)
+        counts = dict(Movie.objects.values_list('id', 'favorites_count'))
+        self.assertEqual(counts[ids[0]], 1)
+        self.assertTrue(all(counts[movie_id] == 1 for movie_id in ids[1:]))
+
+    def test_invalid_body_is_rejected(self):
+        response = self.client.post('/favorites/bulk/', json.dumps({'add': '1'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages cover every row once in order, ties included"""
+
+    PER_PAGE = 4
+
+    def setUp(self):
+        # Few distinct ratings and one year, so the id has to break ties
+        for i in range(11):
+            Movie.objects.create(
+                title=f'Film {i}', slug=f'film-{i}', description='Test', year=2025,
+                director='Rejissor', actors='Aktyor', genre='Drama', rating=[7.0, 8.5, 9.0][i % 3],
+            )
+        self.queryset = Movie.objects.all()
+        self.expected = list(
+            self.queryset.order_by(*pagination.BY_RATING).values_list('id', flat=True)
+        )
+
+    def page(self, cursor=None):
+        return pagination.paginate(self.queryset, pagination.BY_RATING, cursor, self.PER_PAGE)
+
+    def test_cursor_round_trip(self):
+        movie = self.queryset.order_by(*pagination.BY_NEWEST).first()
+        cursor = pagination.encode_cursor(pagination.NEXT, movie, pagination.BY_NEWEST, Movie)
+        self.assertEqual(
+            pagination.decode_cursor(cursor, Movie, pagination.BY_NEWEST),
+            (pagination.NEXT, [movie.created_at, movie.id]),
+        )
+
+    def test_bad_cursor_gives_first_page(self):
+        cursor = self.page().next_cursor
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        forged = signing.dumps([pagination.NEXT, [0.0, 0, 0]], salt='other', compress=True)
+        for bad in (tampered, forged, 'garbage'):
+            self.assertIsNone(pagination.decode_cursor(bad, Movie, pagination.BY_RATING))
+            page = self.page(bad)
+            self.assertEqual([movie.id for movie in page], self.expected[:self.PER_PAGE])
+            self.assertFalse(page.has_previous)
+
+    def test_walk_forward_and_back(self):
+        pages = [self.page()]
+        while pages[-1].has_next:
+            pages.append(self.page(pages[-1].next_cursor))
+        self.assertEqual([movie.id for page in pages for movie in page], self.expected)
+        self.assertEqual(len(pages), 3)
+        self.assertFalse(pages[0].has_previous)
+        self.assertFalse(pages[-1].has_next)
+        self.assertEqual(len(pages[-1]), 3)
+
+        # Stepping back from the last page retraces every earlier page
+        page = pages[-1]
+        for earlier in reversed(pages[:-1]):
+            page = self.page(page.previous_cursor)
+            self.assertEqual([movie.id for movie in page], [movie.id for movie in earlier])
+            self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+
+    def test_cursor_past_the_end_is_empty(self):
+        last = Movie.objects.get(pk=self.expected[-1])
+        cursor = pagination.encode_cursor(pagination.NEXT, last, pagination.BY_RATING, Movie)
+        page = self.page(cursor)
+        self.assertEqual(len(page), 0)
+        self.assertFalse(page.has_next)
+        self.assertFalse(page.has_previous)
+
+
+class PrefixIndexTests(SimpleTestCase):
+    """Typeahead suggestions come from word prefixes and follow edits"""
+
+    def setUp(self):
+        self.index = autocomplete.PrefixIndex()
+        self.index.load([
+            (1, 'the-dark-knight', 'The Dark Knight', 'Christopher Nolan', 'Christian Bale, Heath Ledger'),
+            (2, 'interstellar', 'Interstellar', 'Christopher Nolan', 'Matthew McConaughey'),
+        ])
+
+    def labels(self, query):
+        return [(item['kind'], item['label']) for item in self.index.suggest(query)]
+
+    def test_prefix_of_any_word_matches(self):
+        self.assertEqual(self.labels('  KNIG'), [(autocomplete.TITLE, 'The Dark Knight')])
+        self.assertEqual(self.index.suggest('knight')[0]['slug'], 'the-dark-knight')
+
+    def test_titles_come_before_people(self):
+        self.assertEqual(self.labels('christ'), [
+            (autocomplete.DIRECTOR, 'Christopher Nolan'),
+            (autocomplete.ACTOR, 'Christian Bale'),
+        ])
+        self.assertEqual(self.labels('inter')[0], (autocomplete.TITLE, 'Interstellar'))
+        self.assertEqual(self.labels(''), [])
+
+    def test_update_and_remove(self):
+        self.index.update(2, 'tenet', 'Tenet', 'Christopher Nolan', 'John David Washington')
+        self.assertEqual(self.labels('inter'), [])
+        self.assertEqual(self.labels('ten'), [(autocomplete.TITLE, 'Tenet')])
+        self.index.remove(2)
+        self.assertEqual(self.labels('ten'), [])
+        self.assertEqual(self.labels('nolan'), [(autocomplete.DIRECTOR, 'Christopher Nolan')])
+
+
+@skipIf(fuzzy.np is None, 'trigram search needs NumPy')
+class TrigramSearchTests(SimpleTestCase):
+    """Fuzzy search forgives typos and the Cyrillic spelling of a title"""
+
+    def setUp(self):
+        self.index = fuzzy.TrigramIndex()
+        self.index.load([
+            (1, 'Interstellar', 'Christopher Nolan'),
+            (2, 'Shaytanat', 'Rustam Sadiev'),
+            (3, 'Gladiator', 'Ridley Scott'),
+        ])
+
+    def test_typos_and_scripts(self):
+        self.assertEqual(self.index.search('interstelar'), [1])
+        self.assertEqual(self.index.search('Интерстеллар'), [1])
+        self.assertEqual(self.index.search('шайтанат'), [2])
+        self.assertEqual(self.index.search('nolan'), [1])
+        self.assertEqual(self.index.search('xyz'), [])
+
+    def test_update_and_remove(self):
+        self.index.update(2, 'Sevgi', 'Bek')
+        self.assertEqual(self.index.search('shaytanat'), [])
+        self.assertEqual(self.index.search('sevgi'), [2])
+        self.index.remove(1)
+        self.assertEqual(self.index.search('interstellar'), [])
+
+
+class SpellingTests(TestCase):
+    """"Did you mean" corrects catalog words without rewriting the index file"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/spelling.pickle'
+        settings = override_settings(SPELLING_INDEX_PATH=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # A fresh process-wide index that has not read any file yet
+        for patch in (
+            mock.patch.object(spelling, 'index', spelling.SpellingIndex()),
+            mock.patch.object(spelling, '_version', None),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        Movie.objects.create(
+            title='Interstellar', slug='interstellar', description='Test', year=2014,
+            director='Christopher Nolan', actors='Matthew McConaughey', genre='Drama',
+        )
+        Movie.objects.create(
+            title='Кино олами', slug='kino-olami', description='Test', year=2020,
+            director='Rejissor', actors='Aktyor', genre='Drama',
+        )
+
+    def test_lookup_within_two_edits(self):
+        index = spelling.SpellingIndex()
+        index.load(['Gladiator Interstellar'])
+        self.assertEqual(index.lookup('intersteller'), 'interstellar')
+        self.assertEqual(index.lookup('gldiatr'), 'gladiator')
+        self.assertIsNone(index.lookup('gxxdiatr'))
+
+    def test_suggest_normalizes_the_query(self):
+        self.assertEqual(spelling.suggest('Intersteller'), 'interstellar')
+        self.assertEqual(spelling.suggest('КИНОО'), 'kino')
+        self.assertIsNone(spelling.suggest('interstellar'))
+        self.assertIsNone(spelling.suggest('AND OR NOT'))
+
+    def test_saves_stay_in_memory_until_rebuild(self):
+        spelling.get_index()
+        written = os.stat(self.path).st_mtime_ns
+        spelling.movie_saved(Movie(title='Gladiator', director='Ridley Scott', actors=''))
+        self.assertEqual(spelling.suggest('gladiatr'), 'gladiator')
+        self.assertEqual(os.stat(self.path).st_mtime_ns, written)
+
+
+@skipIf(related.np is None, 'related movies need NumPy and SciPy')
+class RelatedMovieTests(TestCase):
+    """TF-IDF neighbours follow shared people, genres and words"""
+
+    MOVIES = [
+        ('Drama', 'Nolan', 'Ann Lee, Bob Ray', 'space travel wormhole'),
+        ('Drama', 'Nolan', 'Ann Lee', 'dream heist space'),
+        ('Comedy', 'Smith', 'Cat Dog', 'funny wedding party'),
+        ('Comedy', 'Smith', 'Cat Dog, Ann Lee', 'wedding disaster party'),
+        ('Horror', 'Wan', 'Eve Fox', 'haunted house'),
+        ('Horror', 'Wan', 'Eve Fox', 'haunted doll'),
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(RELATED_INDEX_PATH=f'{directory.name}/related.pickle')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patch = mock.patch.object(related, '_index', None)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.movies = [
+            Movie.objects.create(
+                title=f'Film {i}', slug=f'film-{i}', year=2020,
+                genre=genre, director=director, actors=actors, description=description,
+            )
+            for i, (genre, director, actors, description) in enumerate(self.MOVIES)
+        ]
+
+    def test_neighbours_rank_by_similarity(self):
+        index = related.RelatedIndex.fit((i, *fields) for i, fields in enumerate(self.MOVIES))
+        neighbours = dict(index.neighbours(k=2))
+        self.assertEqual([movie_id for movie_id, score in neighbours[0]], [1, 3])
+        self.assertEqual([movie_id for movie_id, score in neighbours[4]], [5])
+        self.assertGreater(neighbours[0][0][1], neighbours[0][1][1])
+        # A movie outside the index is ranked against it
+        vector = index.vectorize('Comedy', 'Smith', 'Cat Dog', 'wedding')
+        self.assertEqual({movie_id for movie_id, score in index.neighbours_of(99, vector, k=2)}, {2, 3})
+
+    def test_rebuild_stores_neighbours(self):
+        self.assertEqual(related.rebuild(k=2), len(self.movies))
+        first, second, third, fourth = self.movies[:4]
+        self.assertEqual(
+            [card.id for card in related.related_cards(first)], [second.id, fourth.id]
+        )
+        self.assertEqual([card.id for card in related.related_cards(third)], [fourth.id])
+
+        # Deleted movies drop out, an edited one is re-ranked on its own
+        second.delete()
+        third.director, third.genre, third.description = 'Nolan', 'Drama', 'space heist'
+        self.assertTrue(related.refresh_movie(third, k=2))
+        self.assertEqual(related.related_cards(third)[0].id, first.id)
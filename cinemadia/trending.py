@@ -0,0 +1,115 @@
+""""Trending now" ranking from exponentially decayed recent activity.
+
+Scores use forward decay: an event at time ``t`` adds
+``weight * 2 ** ((t - EPOCH) / HALF_LIFE)`` to ``Movie.trending_score``.
+Every stored score is then the movie's decayed activity times the same
+growing factor, so ordering by the column ranks by current activity
+without ever rescanning events or rewriting old scores.
+
+The factor overflows a float about 8 years after EPOCH; move EPOCH forward
+and run ``rebuild_trending`` well before then.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+EPOCH = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+HALF_LIFE = timedelta(days=3)
+
+VOTE = 'vote'
+FAVORITE = 'favorite'
+WATCH = 'watch'
+
+EVENT_WEIGHTS = {VOTE: 1.0, FAVORITE: 2.0, WATCH: 1.5}
+
+
+def _growth(when):
+    return 2 ** ((when - EPOCH) / HALF_LIFE)
+
+
+def boost(event, when):
+    """Amount an ``event`` at ``when`` adds to the stored score"""
+    return EVENT_WEIGHTS[event] * _growth(when)
+
+
+def current_score(stored_score, now=None):
+    """Decayed activity as of ``now``, in event-weight units"""
+    return stored_score / _growth(now or timezone.now())
+
+
+def record(movie_id, event, when=None):
+    record_many([movie_id], event, when)
+
+
+def record_many(movie_ids, event, when=None):
+    """Record one ``event`` for each movie in ``movie_ids`` with one UPDATE"""
+    from .models import Movie
+
+    Movie.objects.filter(pk__in=movie_ids).update(
+        trending_score=F('trending_score') + boost(event, when or timezone.now())
+    )
+
+
+def record_counts(counts, event, when=None):
+    """Record ``counts[movie id]`` events per movie with one UPDATE"""
+    from .models import Movie
+
+    if not counts:
+        return
+    amount = boost(event, when or timezone.now())
+    Movie.objects.filter(pk__in=counts).update(
+        trending_score=F('trending_score') + Case(
+            *[When(pk=movie_id, then=Value(count * amount)) for movie_id, count in counts.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
+
+
+def event_sources():
+    """``(event, queryset, timestamp field)`` for every event table"""
+    from .models import Favorite, MovieVote, WatchHistory
+
+    return [
+        (VOTE, MovieVote.objects.all(), 'created_at'),
+        (FAVORITE, Favorite.objects.all(), 'created_at'),
+        (WATCH, WatchHistory.objects.all(), 'watched_at'),
+    ]
+
+
+def _add_boosts(scores, **filters):
+    for event, queryset, timestamp in event_sources():
+        rows = queryset.filter(**{f'{timestamp}__{lookup}': value for lookup, value in filters.items()})
+        for movie_id, when in rows.values_list('movie_id', timestamp).iterator():
+            scores[movie_id] += boost(event, when)
+
+
+def rebuild():
+    """Recompute every score from the event tables; returns movies scored.
+
+    The bulk of the events is scanned outside any transaction. The reset
+    and the write happen in one transaction that also adds the events
+    recorded since the scan started, so readers never see zeroed scores
+    and no event is lost.
+    """
+    from .models import Movie
+
+    started = timezone.now()
+    scores = defaultdict(float)
+    _add_boosts(scores, lt=started)
+    with transaction.atomic():
+        # The reset takes the write lock first, so new events wait for us
+        Movie.objects.update(trending_score=0.0)
+        _add_boosts(scores, gte=started)
+        movies = [Movie(pk=movie_id, trending_score=score) for movie_id, score in scores.items()]
+        Movie.objects.bulk_update(movies, ['trending_score'], batch_size=500)
+    return len(movies)
+
+
+def trending_movies(limit=15):
+    from .models import Movie
+
+    return Movie.objects.filter(trending_score__gt=0).order_by('-trending_score')[:limit]
@@ -6,8 +6,14 @@ app_name = 'cinemadia'
 urlpatterns = [
     path('', views.home, name='home'),
     path('movie/<slug:slug>/', views.movie_detail, name='movie_detail'),
+    path('movie/<slug:slug>/similar/', views.similar_view, name='similar'),
     path('category/<str:category>/', views.category_view, name='category'),
     path('genre/<str:genre>/', views.genre_view, name='genre'),
+    path('person/<str:slug>/', views.person_view, name='person'),
+    path('search/autocomplete/', views.autocomplete_view, name='autocomplete'),
+    path('trending/', views.trending_view, name='trending'),
+    path('movies/more/', views.more_movies, name='more_movies'),
+    path('movies/state/', views.movie_state_view, name='movie_state'),
     
     # User authentication
     path('register/', views.register, name='register'),
@@ -18,6 +24,8 @@ urlpatterns = [
     path('movie/<int:movie_id>/watchlist/', views.toggle_watchlist, name='toggle_watchlist'),
     path('movie/<int:movie_id>/review/', views.add_review, name='add_review'),
     path('movie/<int:movie_id>/vote/', views.vote_movie, name='vote_movie'),
+    path('favorites/bulk/', views.bulk_favorites, name='bulk_favorites'),
+    path('watchlist/bulk/', views.bulk_watchlist, name='bulk_watchlist'),
     
     # User lists
     path('favorites/', views.favorites_list, name='favorites'),
@@ -0,0 +1,63 @@
+"""Add and remove many movies at once in a user's favorites or watchlist.
+
+Used by clients that sync changes made offline. Whatever the number of
+movies, a sync is a fixed handful of queries: one to validate the ids,
+one to read the entries that already exist, one bulk insert, one delete,
+and one UPDATE each for the movies' counts and trending scores. Bulk
+inserts send no signals, so what the signals would do is done here once
+for the whole batch, and the counts are recounted for the touched movies
+rather than shifted once per deleted row.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters, feeds, trending, user_state, writebehind
+
+FAVORITE = 'favorite'
+WATCHLIST = 'watchlist'
+
+# Movie ids accepted in one request, added and removed together
+MAX_BULK_IDS = 500
+
+
+def list_model(kind):
+    from .models import Favorite, Watchlist
+
+    return Favorite if kind == FAVORITE else Watchlist
+
+
+def bulk_change(kind, user, add=(), remove=()):
+    """Put the movies ``add`` into the user's ``kind`` list and take the
+    movies ``remove`` out; an id in both is removed. Returns ``(ids now in
+    the list, ids that are no movie)`` for the requested ids."""
+    from .models import Movie
+
+    model = list_model(kind)
+    remove = set(remove)
+    add = set(add) - remove
+    requested = add | remove
+    # Clicks still buffered are older than this sync; write them first so
+    # they do not undo it when they are flushed
+    writebehind.flush()
+    with transaction.atomic():
+        valid = set(Movie.objects.filter(pk__in=requested).values_list('pk', flat=True))
+        existing = set(
+            model.objects.filter(user=user, movie_id__in=valid).values_list('movie_id', flat=True)
+        )
+        added = (add & valid) - existing
+        removed = remove & existing
+        model.objects.bulk_create(
+            [model(user=user, movie_id=movie_id) for movie_id in added], ignore_conflicts=True
+        )
+        if removed:
+            # Counts and caches are fixed once below, not per deleted row
+            with counters.paused(reconcile_after=False):
+                model.objects.filter(user=user, movie_id__in=removed).delete()
+        if added or removed:
+            counters.reconcile_list_counts(movie_ids=added | removed)
+        if added and kind == FAVORITE:
+            trending.record_many(added, trending.FAVORITE, timezone.now())
+    if added or removed:
+        user_state.invalidate(user.pk)
+        feeds.invalidate(user.pk)
+    return (existing | added) - removed, requested - valid
@@ -0,0 +1,89 @@
+"""Per-user vote, favorite and watchlist state for any set of movies.
+
+A user's favorite and watchlist ids and their votes are read with one
+UNION query and cached as a whole; signals drop the entry whenever one
+of those rows changes. Looking up the state of a detail page or of every
+card on a grid is then a single cache read.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Value
+
+from . import writebehind
+
+FAVORITE = 'favorite'
+WATCHLIST = 'watchlist'
+
+
+def state_key(user_id):
+    return f'cinemadia:user_state:{user_id}'
+
+
+def _load(user_id):
+    from .models import Favorite, MovieVote, Watchlist
+
+    favorites = Favorite.objects.filter(user_id=user_id).order_by().annotate(
+        kind=Value(FAVORITE, output_field=CharField())
+    )
+    watchlist = Watchlist.objects.filter(user_id=user_id).order_by().annotate(
+        kind=Value(WATCHLIST, output_field=CharField())
+    )
+    rows = favorites.values_list('movie_id', 'kind').union(
+        watchlist.values_list('movie_id', 'kind'),
+        MovieVote.objects.filter(user_id=user_id).order_by().values_list('movie_id', 'vote_type'),
+        all=True,
+    )
+    state = {FAVORITE: set(), WATCHLIST: set(), 'votes': {}}
+    for movie_id, kind in rows:
+        if kind in (FAVORITE, WATCHLIST):
+            state[kind].add(movie_id)
+        else:
+            state['votes'][movie_id] = kind
+    return state
+
+
+def get_state(user):
+    """``{'favorite': ids, 'watchlist': ids, 'votes': {id: type}}`` for
+    ``user``; empty for anonymous users"""
+    if not user.is_authenticated:
+        return {FAVORITE: set(), WATCHLIST: set(), 'votes': {}}
+    key = state_key(user.pk)
+    state = cache.get(key)
+    if state is None:
+        state = _load(user.pk)
+        cache.set(key, state, settings.USER_STATE_CACHE_TIMEOUT)
+    # Clicks still waiting in the write-behind buffer win over the database
+    for (kind, movie_id), value in writebehind.overlay(user.pk).items():
+        if kind == writebehind.VOTE:
+            if value:
+                state['votes'][movie_id] = value
+            else:
+                state['votes'].pop(movie_id, None)
+        elif value:
+            state[kind].add(movie_id)
+        else:
+            state[kind].discard(movie_id)
+    return state
+
+
+def movie_states(user, movie_ids):
+    """``{movie id: {'vote', 'favorite', 'watchlist'}}`` for ``movie_ids``"""
+    state = get_state(user)
+    return {
+        movie_id: {
+            'vote': state['votes'].get(movie_id),
+            'favorite': movie_id in state[FAVORITE],
+            'watchlist': movie_id in state[WATCHLIST],
+        }
+        for movie_id in movie_ids
+    }
+
+
+def favorite_ids(user, movies):
+    """The ids among ``movies`` (cards or instances) that ``user`` favorited"""
+    favorites = get_state(user)[FAVORITE]
+    return {movie.pk for movie in movies if movie.pk in favorites}
+
+
+def invalidate(user_id):
+    cache.delete(state_key(user_id))
@@ -1,75 +1,148 @@
+import json
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q, Avg, Count
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.db import IntegrityError, transaction
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Window
+from django.db.models.functions import RowNumber
 from django.core.paginator import Paginator
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from .models import Movie, Favorite, Watchlist, Review, WatchHistory, UserProfile, MovieVote
+from .models import Movie, Favorite, Watchlist, Review, WatchHistory, UserProfile, MovieVote, Genre, Person
 from .forms import CustomUserCreationForm, ReviewForm, UserProfileForm
-from collections import defaultdict
+from . import autocomplete, cards, catalog, collaborative, counters, embeddings, facets, feeds, pagination, related, sampling, search, spelling, trending, user_lists, user_state, writebehind
+from .caching import ACTIVITY, generation, get_or_build, make_key
   
 # Create your views here.
 def home(request):
     # Search functionality
-    query = request.GET.get('q', '')
+    query = request.GET.get('q', '').strip()
+    facet_counts = None
     if query:
-        movies = Movie.objects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(genre__icontains=query) |
-            Q(director__icontains=query) |
-            Q(actors__icontains=query)
-        ).order_by('-rating', '-year')
+        # Page through the cached id list, loading only the current page's rows
+        normalized = search.normalize_query(query)
+        result_ids = search.result_ids(query)
+        paginator = Paginator(result_ids, 12)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        page_obj.object_list = search.fetch_movies(page_obj.object_list, query)
+        total_count = paginator.count
+        facet_counts = facets.get_facets(
+            'search', normalized, Movie.objects.filter(id__in=result_ids)
+        )
     else:
-        movies = Movie.objects.all().order_by('-created_at')
-    
+        cursor = request.GET.get('cursor')
+        # Keyed on the decoded position: every bad cursor is page one, so
+        # made-up strings cannot fill the cache
+        position = pagination.decode_cursor(cursor, Movie, pagination.BY_NEWEST)
+        page_obj = home_block(
+            ('page', position),
+            lambda: card_page(Movie.objects.all(), pagination.BY_NEWEST, cursor if position else None),
+        )
+        total_count = home_block('count', counters.total)
 
-    paginator = Paginator(movies, 12)  # 12 movies per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Offer a corrected query when nothing matched
+    suggestion = spelling.suggest(query) if query and not total_count else None
     
-    featured_movie = Movie.objects.filter(is_featured=True).first()
-    
-    # Organize movies by category
-    movies_by_category = defaultdict(list)
-    for movie in Movie.objects.all()[:30]:  # Limit for performance
-        movies_by_category[movie.category].append(movie)
+    featured_movie = home_block('featured', Movie.objects.filter(is_featured=True).first)
+    movies_by_category = get_movies_by_category()
     
     # Get popular and random movies
-    popular_movies = get_popular_movies()
-    random_movies = get_random_movies()
+    popular_movies = home_block('popular', get_popular_movies)
+    trending_movies = home_block('trending', lambda: cards.cards(trending.trending_movies()))
+    random_movies = home_block('random', get_random_movies)
+    feed_movies = feeds.feed_movies(request.user) if request.user.is_authenticated else None
     
     context = {
         'movies': page_obj,
         'featured_movie': featured_movie,
         'movies_by_category': movies_by_category,
         'popular_movies': popular_movies,
+        'trending_movies': trending_movies,
         'random_movies': random_movies,
+        'feed_movies': feed_movies,
         'query': query,
-        'total_count': movies.count() if query else Movie.objects.count(),
+        'suggestion': suggestion,
+        'facets': facet_counts,
+        'total_count': total_count,
     }
     return render(request, 'home.html', context)
 
+def trending_view(request):
+    """JSON list of the movies with the most recent activity"""
+    rows = home_block(
+        'trending_rows',
+        lambda: list(cards.card_values(trending.trending_movies(), '', 'trending_score')),
+    )
+    results = []
+    for row in rows:
+        movie = cards.MovieCard.from_row(row)
+        results.append({
+            'id': movie.id,
+            'title': movie.title,
+            'slug': movie.slug,
+            'poster': movie.get_poster(),
+            'score': round(trending.current_score(row['trending_score']), 3),
+        })
+    return JsonResponse({'results': results})
+
+# Largest number of movies one state request may ask about
+MAX_STATE_IDS = 100
+
+def movie_state_view(request):
+    """JSON vote/favorite/watchlist state of the user for ``?ids=1,2,3``"""
+    movie_ids = []
+    for value in request.GET.get('ids', '').split(',')[:MAX_STATE_IDS]:
+        if value.strip().isdigit():
+            movie_ids.append(int(value))
+    states = user_state.movie_states(request.user, movie_ids)
+    return JsonResponse({'results': {str(movie_id): state for movie_id, state in states.items()}})
+
+def similar_view(request, slug):
+    """JSON "more like this" list from the embedding index"""
+    movie = get_object_or_404(Movie.objects.only('id'), slug=slug)
+    scores = dict(embeddings.similar(movie.id, 12))
+    results = []
+    for card in cards.cards_by_id(list(scores)):
+        results.append({
+            'id': card.id,
+            'title': card.title,
+            'slug': card.slug,
+            'poster': card.get_poster(),
+            'score': round(scores[card.id], 3),
+        })
+    return JsonResponse({'results': results})
+
+def autocomplete_view(request):
+    """JSON title/director/actor suggestions for the search box"""
+    query = request.GET.get('q', '')
+    return JsonResponse({
+        'query': query,
+        'results': autocomplete.suggest(query),
+    })
+
 def movie_detail(request, slug):
-    movie = get_object_or_404(Movie, slug=slug)
-    movies = Movie.objects.exclude(id=movie.id)[:6]  # Related movies
+    movie = get_object_or_404(
+        Movie.objects.prefetch_related('genres', 'directors', 'cast'),
+        slug=slug
+    )
+    movies = related.related_cards(movie) or cards.cards(Movie.objects.exclude(id=movie.id)[:6])
     
-    # Get user's vote if authenticated
-    user_vote = None
-    if request.user.is_authenticated:
-        try:
-            vote = MovieVote.objects.get(user=request.user, movie=movie)
-            user_vote = vote.vote_type
-        except MovieVote.DoesNotExist:
-            user_vote = None
+    state = user_state.movie_states(request.user, [movie.id])[movie.id]
     
     context = {
         'movie': movie,
         'movies': movies,
         'related_movies': movies,
-        'user_vote': user_vote,
+        'also_liked': related.related_cards(movie, source=collaborative.SOURCE),
+        'user_vote': state['vote'],
+        'is_favorite': state['favorite'],
+        'in_watchlist': state['watchlist'],
     }
     return render(request, 'movie_detail.html', context)
 
@@ -130,18 +203,19 @@ def category_view(request, category):
     category_choices = dict(Movie.CATEGORY_CHOICES)
     category_name = category_choices.get(category, '')
     
-    movies = Movie.objects.filter(category=category).order_by('-rating', '-year')
+    movies = Movie.objects.filter(category=category)
     
     # Pagination
-    paginator = Paginator(movies, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = card_page(movies, pagination.BY_RATING, request.GET.get('cursor'))
     
     context = {
         'movies': page_obj,
         'category': category,
         'category_name': category_name,
-        'total_count': movies.count(),
+        'favorite_ids': user_state.favorite_ids(request.user, page_obj),
+        'facets': facets.get_facets('category', category, movies),
+        'total_count': counters.category_count(category),
+        'more_url': f"{reverse('cinemadia:more_movies')}?{urlencode({'source': 'category', 'key': category})}",
     }
     
     # Use specific template for each category
@@ -156,41 +230,97 @@ def category_view(request, category):
     template_name = template_map.get(category, 'category.html')
     return render(request, template_name, context)
 
+# Badges shown on the cards of some category pages
+CATEGORY_BADGES = {
+    'hind': ('badge-bollywood', 'BOLLYWOOD'),
+    'multfilm': ('badge-cartoon', 'CARTOON'),
+    'premyera': ('badge-new', 'NEW'),
+    'serial': ('badge-series', 'SERIES'),
+}
+
+def more_movies(request):
+    """Next page of a movie grid as an HTML fragment, for infinite scroll"""
+    source = request.GET.get('source')
+    key = request.GET.get('key', '')
+    badge = None
+    if source == 'category':
+        movies, ordering = Movie.objects.filter(category=key), pagination.BY_RATING
+        badge = CATEGORY_BADGES.get(key)
+    elif source == 'genre':
+        movies, ordering = Movie.objects.filter(genres__slug=catalog.genre_slug(key)), pagination.BY_RATING
+    else:
+        movies, ordering = Movie.objects.all(), pagination.BY_NEWEST
+    
+    page_obj = card_page(movies, ordering, request.GET.get('cursor'))
+    response = render(request, 'movie_cards.html', {
+        'movies': page_obj,
+        'badge': badge,
+        'favorite_ids': user_state.favorite_ids(request.user, page_obj),
+    })
+    if page_obj.has_next:
+        response['X-Next-Cursor'] = page_obj.next_cursor
+    return response
+
 def genre_view(request, genre):
     """View for displaying movies by genre"""
-    movies = Movie.objects.filter(genre__icontains=genre).order_by('-rating', '-year')
+    genre_obj = Genre.objects.filter(slug=catalog.genre_slug(genre)).first()
+    if genre_obj:
+        movies = genre_obj.movies.all()
+    else:
+        movies = Movie.objects.none()
     
     # Pagination
-    paginator = Paginator(movies, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = card_page(movies, pagination.BY_RATING, request.GET.get('cursor'))
     
     context = {
         'movies': page_obj,
-        'genre': genre,
-        'total_count': movies.count(),
+        'genre': genre_obj.name if genre_obj else genre,
+        'favorite_ids': user_state.favorite_ids(request.user, page_obj),
+        'total_count': counters.genre_count(genre_obj.slug) if genre_obj else 0,
+        'more_url': f"{reverse('cinemadia:more_movies')}?{urlencode({'source': 'genre', 'key': genre})}",
     }
     return render(request, 'genre.html', context)
 
+def person_view(request, slug):
+    """View for displaying an actor's or director's movies"""
+    person = get_object_or_404(Person, slug=slug)
+    
+    context = {
+        'person': person,
+        'directed': person.directed.order_by('-year', '-rating'),
+        'acted_in': person.acted_in.order_by('-year', '-rating'),
+    }
+    return render(request, 'person.html', context)
+
 @login_required
 @require_POST
 def toggle_favorite(request, movie_id):
     """Toggle movie in favorites"""
     movie = get_object_or_404(Movie, id=movie_id)
-    favorite, created = Favorite.objects.get_or_create(user=request.user, movie=movie)
-    
-    if not created:
-        favorite.delete()
-        is_favorite = False
-        message = 'Sevimlilardan o\'chirildi'
-    else:
-        is_favorite = True
-        message = 'Sevimlilarga qo\'shildi'
+    if writebehind.is_enabled():
+        is_favorite, favorites_count = writebehind.toggle(writebehind.FAVORITE, request.user, movie)
+        return JsonResponse({
+            'is_favorite': is_favorite,
+            'message': 'Sevimlilarga qo\'shildi' if is_favorite else 'Sevimlilardan o\'chirildi',
+            'favorites_count': favorites_count,
+        })
+    # The entry and favorites_count (shifted by a signal) change together
+    with transaction.atomic():
+        favorite, created = Favorite.objects.get_or_create(user=request.user, movie=movie)
+        
+        if not created:
+            favorite.delete()
+            is_favorite = False
+            message = 'Sevimlilardan o\'chirildi'
+        else:
+            is_favorite = True
+            message = 'Sevimlilarga qo\'shildi'
+    movie.refresh_from_db(fields=['favorites_count'])
     
     return JsonResponse({
         'is_favorite': is_favorite,
         'message': message,
-        'favorites_count': Favorite.objects.filter(movie=movie).count()
+        'favorites_count': movie.favorites_count
     })
 
 @login_required
@@ -198,21 +328,66 @@ def toggle_favorite(request, movie_id):
 def toggle_watchlist(request, movie_id):
     """Toggle movie in watchlist"""
     movie = get_object_or_404(Movie, id=movie_id)
-    watchlist, created = Watchlist.objects.get_or_create(user=request.user, movie=movie)
-    
-    if not created:
-        watchlist.delete()
-        in_watchlist = False
-        message = 'Ko\'rish ro\'yxatidan o\'chirildi'
-    else:
-        in_watchlist = True
-        message = 'Ko\'rish ro\'yxatiga qo\'shildi'
+    if writebehind.is_enabled():
+        in_watchlist, _ = writebehind.toggle(writebehind.WATCHLIST, request.user, movie)
+        return JsonResponse({
+            'in_watchlist': in_watchlist,
+            'message': 'Ko\'rish ro\'yxatiga qo\'shildi' if in_watchlist else 'Ko\'rish ro\'yxatidan o\'chirildi',
+        })
+    with transaction.atomic():
+        watchlist, created = Watchlist.objects.get_or_create(user=request.user, movie=movie)
+        
+        if not created:
+            watchlist.delete()
+            in_watchlist = False
+            message = 'Ko\'rish ro\'yxatidan o\'chirildi'
+        else:
+            in_watchlist = True
+            message = 'Ko\'rish ro\'yxatiga qo\'shildi'
     
     return JsonResponse({
         'in_watchlist': in_watchlist,
         'message': message
     })
 
+def _bulk_ids(data, name):
+    """The movie ids under ``name`` in a bulk request body, or None"""
+    values = data.get(name, [])
+    if not isinstance(values, list) or not all(type(value) is int for value in values):
+        return None
+    return values
+
+def bulk_list_change(request, kind):
+    """Apply ``{"add": [ids], "remove": [ids]}`` to one of the user's lists"""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    add, remove = _bulk_ids(data, 'add'), _bulk_ids(data, 'remove')
+    if add is None or remove is None:
+        return JsonResponse({'error': '"add" and "remove" must be lists of movie ids'}, status=400)
+    if len(add) + len(remove) > user_lists.MAX_BULK_IDS:
+        return JsonResponse({'error': f'At most {user_lists.MAX_BULK_IDS} movie ids per request'}, status=400)
+    listed, unknown = user_lists.bulk_change(kind, request.user, add, remove)
+    return JsonResponse({
+        'results': {str(movie_id): movie_id in listed for movie_id in sorted((set(add) | set(remove)) - unknown)},
+        'unknown': sorted(unknown),
+    })
+
+@login_required
+@require_POST
+def bulk_favorites(request):
+    """Add and remove many favorites in one request"""
+    return bulk_list_change(request, user_lists.FAVORITE)
+
+@login_required
+@require_POST
+def bulk_watchlist(request):
+    """Add and remove many watchlist entries in one request"""
+    return bulk_list_change(request, user_lists.WATCHLIST)
+
 @login_required
 def add_review(request, movie_id):
     """Add review to movie"""
@@ -230,7 +405,7 @@ def add_review(request, movie_id):
             avg_rating = Review.objects.filter(movie=movie).aggregate(Avg('rating'))['rating__avg']
             if avg_rating:
                 movie.rating = round(avg_rating, 1)
-                movie.save()
+                movie.save(update_fields=['rating'])
             
             messages.success(request, 'Fikringiz qo\'shildi!')
             return redirect('cinemadia:movie_detail', slug=movie.slug)
@@ -245,29 +420,23 @@ def add_review(request, movie_id):
 @login_required
 def favorites_list(request):
     """List all user's favorite movies"""
-    favorites = Favorite.objects.filter(user=request.user).select_related('movie')
+    favorites = Favorite.objects.filter(user=request.user)
     
-    paginator = Paginator(favorites, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = card_page(favorites, pagination.BY_NEWEST, request.GET.get('cursor'), prefix='movie__')
     
     return render(request, 'favorites.html', {
         'favorites': page_obj,
-        'total_count': favorites.count()
     })
 
 @login_required
 def watchlist_view(request):
     """List all user's watchlist movies"""
-    watchlist = Watchlist.objects.filter(user=request.user).select_related('movie')
+    watchlist = Watchlist.objects.filter(user=request.user)
     
-    paginator = Paginator(watchlist, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = card_page(watchlist, pagination.BY_NEWEST, request.GET.get('cursor'), prefix='movie__')
     
     return render(request, 'watchlist.html', {
         'watchlist': page_obj,
-        'total_count': watchlist.count()
     })
 
 
@@ -281,72 +450,106 @@ def vote_movie(request, movie_id):
     if vote_type not in ['like', 'dislike']:
         return JsonResponse({'error': 'Invalid vote type'}, status=400)
     
-    # Get or create vote
-    vote, created = MovieVote.objects.get_or_create(
-        user=request.user,
-        movie=movie,
-        defaults={'vote_type': vote_type}
-    )
-    
-    # If vote exists and is different, update it
-    if not created and vote.vote_type != vote_type:
-        # Remove old vote count
-        if vote.vote_type == 'like':
-            movie.likes_count = max(0, movie.likes_count - 1)
-        else:
-            movie.dislikes_count = max(0, movie.dislikes_count - 1)
-        
-        # Update vote type
-        vote.vote_type = vote_type
-        vote.save()
-    elif not created and vote.vote_type == vote_type:
-        # User clicked same vote - remove it
-        vote.delete()
-        if vote_type == 'like':
-            movie.likes_count = max(0, movie.likes_count - 1)
-        else:
-            movie.dislikes_count = max(0, movie.dislikes_count - 1)
-        movie.save()
-        
+    if writebehind.is_enabled():
+        user_vote, likes_count, dislikes_count = writebehind.vote(request.user, movie, vote_type)
         return JsonResponse({
             'success': True,
-            'likes_count': movie.likes_count,
-            'dislikes_count': movie.dislikes_count,
-            'user_vote': None
+            'likes_count': likes_count,
+            'dislikes_count': dislikes_count,
+            'user_vote': user_vote
         })
     
-    # Add new vote count
-    if vote_type == 'like':
-        movie.likes_count += 1
-    else:
-        movie.dislikes_count += 1
+    # Vote count changes, keyed by vote type
+    delta = {'like': 0, 'dislike': 0}
+    user_vote = vote_type
     
-    movie.save()
+    with transaction.atomic():
+        # Insert first: the write takes the lock up front, so concurrent
+        # votes queue here instead of all reading the same state
+        try:
+            with transaction.atomic():
+                MovieVote.objects.create(user=request.user, movie=movie, vote_type=vote_type)
+            created = True
+        except IntegrityError:
+            created = False
+            vote = MovieVote.objects.select_for_update().get(user=request.user, movie=movie)
+        
+        if created:
+            delta[vote_type] += 1
+        elif vote.vote_type != vote_type:
+            # Move the vote from the old type to the new one
+            delta[vote.vote_type] -= 1
+            delta[vote_type] += 1
+            vote.vote_type = vote_type
+            vote.save(update_fields=['vote_type'])
+        else:
+            # User clicked same vote - remove it
+            vote.delete()
+            delta[vote_type] -= 1
+            user_vote = None
+        
+        # Counts and popularity_score change in one UPDATE
+        movie.add_votes(likes=delta['like'], dislikes=delta['dislike'])
     
     return JsonResponse({
         'success': True,
         'likes_count': movie.likes_count,
         'dislikes_count': movie.dislikes_count,
-        'user_vote': vote_type
+        'user_vote': user_vote
     })
 
 
+# Movies per category shelf on the home page
+SHELF_SIZE = 12
+
+def card_page(queryset, ordering, cursor, prefix=''):
+    """Keyset page of movie cards; ``prefix`` reaches the movie from a
+    related list such as favorites, which is paginated on its own keys."""
+    extra = [name.lstrip('-') for name in ordering] if prefix else []
+    page_obj = pagination.paginate(cards.card_values(queryset, prefix, *extra), ordering, cursor)
+    page_obj.object_list = cards.to_cards(page_obj.object_list, prefix)
+    return page_obj
+
+
+def home_block(name, build):
+    """Cached home page block, dropped on any movie, vote or review write"""
+    key = make_key('home', name, generation(ACTIVITY))
+    return get_or_build(key, build, settings.HOME_CACHE_TIMEOUT)
+
+
+def get_movies_by_category():
+    """(category, label, movies) for every non-empty category shelf, each cached on its own"""
+    keys = {category: make_key('shelf', category) for category, name in Movie.CATEGORY_CHOICES}
+    cached = cache.get_many(keys.values())
+    missing = [category for category, key in keys.items() if key not in cached]
+    if missing:
+        # One windowed query ranks every missing shelf at once
+        ranked = Movie.objects.filter(category__in=missing).annotate(
+            shelf_rank=Window(
+                RowNumber(),
+                partition_by=F('category'),
+                order_by=[F('rating').desc(), F('year').desc()],
+            )
+        ).filter(shelf_rank__lte=SHELF_SIZE).order_by('category', 'shelf_rank')
+        shelves = {category: [] for category in missing}
+        for movie in cards.cards(ranked):
+            shelves[movie.category].append(movie)
+        fetched = {keys[category]: shelf for category, shelf in shelves.items()}
+        cache.set_many(fetched, settings.HOME_CACHE_TIMEOUT)
+        cached.update(fetched)
+    return [
+        (category, name, cached[keys[category]])
+        for category, name in Movie.CATEGORY_CHOICES
+        if cached[keys[category]]
+    ]
+
+
 def get_popular_movies():
     """Get popular movies based on votes and engagement"""
-    from django.db.models import F, Case, When, IntegerField
-    
-    movies = Movie.objects.annotate(
-        total_votes=F('likes_count') + F('dislikes_count'),
-        popularity_score=Case(
-            When(total_votes=0, then=0),
-            default=(F('likes_count') * 100 / F('total_votes')) + (F('total_votes') / 10),
-            output_field=IntegerField()
-        )
-    ).filter(total_votes__gt=0).order_by('-popularity_score')[:10]
-    
-    return movies
+    # Only voted movies score above zero
+    return cards.cards(Movie.objects.filter(popularity_score__gt=0).order_by('-popularity_score')[:10])
 
 
 def get_random_movies():
     """Get random movies for carousel"""
-    return Movie.objects.order_by('?')[:15]
+    return sampling.random_movies(15)
@@ -0,0 +1,433 @@
+"""Write-behind buffer for votes, favorites and watchlist toggles.
+
+On SQLite every toggle takes the database write lock, so bursts of them
+queue up and time out. Instead the views record the state the user wants
+(``like``, ``favorite``, ... or None) for a (user, movie) pair, answer
+with the projected counts, and a background thread writes everything
+recorded since its last run in a few batched transactions. Each batch
+inserts, updates and deletes its rows in bulk with the per-row signal
+work paused, then moves the vote counts once per movie, the list counts,
+trending scores and activity generation once, and drops the cached state
+and feed of each user it touched.
+
+Each event is also appended to a journal file before the view answers
+and handed to the operating system, so it outlives the process.
+Events set a state rather than flip it, so replaying a journal that was
+partly written already is harmless: a process that dies leaves its
+journal behind and the flush thread of any other process replays it
+within REPLAY_INTERVAL. A process that exits normally flushes first.
+
+A click reads the stored state and counts, then records itself against
+the pending ones; if a flush wrote to the database in between, the click
+starts over, so the counts it answers with are never off by a flush.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import counters, feeds, trending, user_state
+from .caching import ACTIVITY, bump_generation
+
+try:
+    import fcntl
+except ImportError:  # journals of dead processes are only replayed by command
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+VOTE = 'vote'
+FAVORITE = 'favorite'
+WATCHLIST = 'watchlist'
+
+# Seconds between looks for journals left by processes that died
+REPLAY_INTERVAL = 60
+
+
+def is_enabled():
+    return settings.WRITE_BEHIND_ENABLED
+
+
+def _shift(deltas, movie_id, previous, desired):
+    """Count the move from state ``previous`` to ``desired`` in ``deltas``"""
+    if previous == desired:
+        return
+    if previous:
+        deltas[movie_id, previous] -= 1
+    if desired:
+        deltas[movie_id, desired] += 1
+
+
+class Entry:
+    """A pending state: ``base`` is what the database had before the first
+    recorded event, ``desired`` what the last one asked for"""
+
+    __slots__ = ('base', 'desired')
+
+    def __init__(self, base, desired):
+        self.base = base
+        self.desired = desired
+
+
+class WriteBehindBuffer:
+    """Pending states keyed by ``(kind, user id, movie id)``"""
+
+    def __init__(self, directory, flush_interval, batch_size):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.token = uuid.uuid4().hex
+        self._pending = {}
+        self._inflight = {}
+        self._deltas = Counter()
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        # Bumped as each flush starts writing; _applying is set until it ends
+        self._epoch = 0
+        self._applying = False
+        self._wake = threading.Event()
+        self._segment = 0
+        self._journal = None
+        self._segments = []
+        self._thread = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Held for the life of the process: a journal whose lock can be
+        # taken belongs to a process that is gone
+        self._lock_handle = open(self.directory / f'{self.token}.lock', 'w')
+        if fcntl is not None:
+            fcntl.flock(self._lock_handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def overlay(self, user_id):
+        """``{(kind, movie id): state}`` of everything pending for a user"""
+        with self._lock:
+            return {
+                (kind, movie_id): entry.desired
+                for entries in (self._inflight, self._pending)
+                for (kind, user, movie_id), entry in entries.items()
+                if user == user_id
+            }
+
+    def click(self, key, read, decide):
+        """Record a click on ``key``. ``read()`` returns the stored state
+        and ``{state: stored count}`` of the movie; ``decide(current)`` the
+        state the click asks for. Returns that state and the counts
+        projected past the pending writes."""
+        while True:
+            with self._flushed:
+                while self._applying:
+                    self._flushed.wait()
+                epoch = self._epoch
+            stored, counts = read()
+            with self._lock:
+                if self._epoch != epoch:
+                    continue  # a flush wrote since the read
+                entry = self._pending.get(key)
+                if entry is None:
+                    entry = self._pending[key] = Entry(stored, stored)
+                desired = decide(entry.desired)
+                _shift(self._deltas, key[2], entry.desired, desired)
+                entry.desired = desired
+                self._append([*key, desired])
+                projected = {
+                    state: max(count + self._deltas[key[2], state], 0) for state, count in counts.items()
+                }
+                full = len(self._pending) >= self.batch_size
+            break
+        self.start()
+        if full:
+            self._wake.set()
+        return desired, projected
+
+    def _append(self, event):
+        if self._journal is None:
+            self._segment += 1
+            path = self.directory / f'{self.token}-{self._segment:06d}.jsonl'
+            self._journal = open(path, 'a')
+            self._segments.append(path)
+        self._journal.write(json.dumps(event) + '\n')
+        self._journal.flush()
+
+    def flush(self):
+        """Write everything pending; returns the number of states written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = self._inflight = self._pending
+                self._pending = {}
+                self._epoch += 1
+                self._applying = True
+                # Events from now on go to a new segment; the old ones
+                # are deleted once their states are in the database
+                segments, self._segments = self._segments, []
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+            try:
+                apply({key: entry.desired for key, entry in batch.items()}, self.batch_size)
+            except Exception:
+                with self._lock:
+                    for key, entry in batch.items():
+                        pending = self._pending.get(key)
+                        if pending is None:
+                            self._pending[key] = entry
+                        else:
+                            pending.base = entry.base
+                    self._inflight = {}
+                    self._segments = segments + self._segments
+                    self._applying = False
+                    self._flushed.notify_all()
+                raise
+            with self._lock:
+                for (kind, user_id, movie_id), entry in batch.items():
+                    _shift(self._deltas, movie_id, entry.desired, entry.base)
+                self._deltas = Counter({key: delta for key, delta in self._deltas.items() if delta})
+                self._inflight = {}
+                self._applying = False
+                self._flushed.notify_all()
+            for path in segments:
+                os.remove(path)
+            return len(batch)
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='cinemadia-write-behind', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        replayed_at = None
+        while True:
+            if replayed_at is None or time.monotonic() - replayed_at >= REPLAY_INTERVAL:
+                replayed_at = time.monotonic()
+                try:
+                    replay_orphans(self)
+                except Exception:
+                    logger.exception('Replaying write-behind journals failed')
+                finally:
+                    connection.close()
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Write-behind flush failed; retrying on the next run')
+            finally:
+                connection.close()
+
+    def close(self):
+        """Flush on a normal exit so a restart leaves no journal behind"""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Write-behind flush at exit failed; the journal is replayed later')
+
+
+def apply(states, batch_size):
+    """Bring the rows for ``{(kind, user id, movie id): state}`` to those
+    states, ``batch_size`` keys per transaction"""
+    items = list(states.items())
+    for start in range(0, len(items), batch_size):
+        with transaction.atomic():
+            _apply_batch(dict(items[start:start + batch_size]))
+
+
+def _apply_batch(states):
+    from django.contrib.auth.models import User
+
+    from .models import Favorite, Movie, MovieVote, Watchlist
+
+    # Users or movies deleted since the event was recorded are skipped
+    movies = set(Movie.objects.filter(pk__in={key[2] for key in states}).values_list('pk', flat=True))
+    users = set(User.objects.filter(pk__in={key[1] for key in states}).values_list('pk', flat=True))
+    states = {key: state for key, state in states.items() if key[1] in users and key[2] in movies}
+
+    by_kind = defaultdict(dict)
+    for (kind, user_id, movie_id), state in states.items():
+        by_kind[kind][user_id, movie_id] = state
+
+    with counters.paused(reconcile_after=False):
+        votes = by_kind[VOTE]
+        existing = {
+            (vote.user_id, vote.movie_id): vote
+            for vote in MovieVote.objects.filter(
+                user_id__in={user_id for user_id, movie_id in votes},
+                movie_id__in={movie_id for user_id, movie_id in votes},
+            )
+            if (vote.user_id, vote.movie_id) in votes
+        }
+        deltas = Counter()
+        created, changed, deleted = [], [], []
+        for (user_id, movie_id), state in votes.items():
+            vote = existing.get((user_id, movie_id))
+            _shift(deltas, movie_id, vote.vote_type if vote else None, state)
+            if vote is None:
+                if state:
+                    created.append(MovieVote(user_id=user_id, movie_id=movie_id, vote_type=state))
+            elif state is None:
+                deleted.append(vote.pk)
+            elif vote.vote_type != state:
+                vote.vote_type = state
+                changed.append(vote)
+        MovieVote.objects.bulk_create(created, ignore_conflicts=True)
+        MovieVote.objects.bulk_update(changed, ['vote_type'])
+        MovieVote.objects.filter(pk__in=deleted).delete()
+
+        added = defaultdict(Counter)
+        touched = set()
+        for kind, model in ((FAVORITE, Favorite), (WATCHLIST, Watchlist)):
+            wanted = by_kind[kind]
+            existing = {
+                (row.user_id, row.movie_id): row
+                for row in model.objects.filter(
+                    user_id__in={user_id for user_id, movie_id in wanted},
+                    movie_id__in={movie_id for user_id, movie_id in wanted},
+                )
+                if (row.user_id, row.movie_id) in wanted
+            }
+            rows, removed = [], []
+            for (user_id, movie_id), state in wanted.items():
+                row = existing.get((user_id, movie_id))
+                if state and row is None:
+                    rows.append(model(user_id=user_id, movie_id=movie_id))
+                    added[kind][movie_id] += 1
+                    touched.add(movie_id)
+                elif not state and row is not None:
+                    removed.append(row.pk)
+                    touched.add(movie_id)
+            model.objects.bulk_create(rows, ignore_conflicts=True)
+            model.objects.filter(pk__in=removed).delete()
+
+    # Counts and popularity move with one UPDATE per movie
+    for movie_id in {movie_id for movie_id, state in deltas}:
+        Movie(pk=movie_id).add_votes(likes=deltas[movie_id, 'like'], dislikes=deltas[movie_id, 'dislike'])
+    if touched:
+        counters.reconcile_list_counts(movie_ids=touched)
+    now = timezone.now()
+    trending.record_counts(Counter(vote.movie_id for vote in created), trending.VOTE, now)
+    trending.record_counts(added[FAVORITE], trending.FAVORITE, now)
+
+    users = {user_id for kind, user_id, movie_id in states}
+    transaction.on_commit(lambda: _invalidate(users, bool(created or changed or deleted)))
+
+
+def _invalidate(user_ids, voted):
+    if voted:
+        bump_generation(ACTIVITY)
+    for user_id in user_ids:
+        user_state.invalidate(user_id)
+        feeds.invalidate(user_id)
+
+
+def _read_journal(paths):
+    """Last recorded state per key across the journal ``paths``"""
+    states = {}
+    for path in sorted(paths):
+        with open(path) as handle:
+            for line in handle:
+                try:
+                    kind, user_id, movie_id, state = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by the crash
+                states[kind, user_id, movie_id] = state
+    return states
+
+
+def replay_orphans(buffer=None):
+    """Write the journals left behind by processes that died; returns the
+    number of states replayed. Without fcntl every journal but this
+    process's own is replayed, so only run it while the site is down."""
+    directory = Path(settings.WRITE_BEHIND_DIR)
+    if not directory.exists():
+        return 0
+    replayed = 0
+    for lock_path in directory.glob('*.lock'):
+        token = lock_path.stem
+        if buffer is not None and token == buffer.token:
+            continue
+        with open(lock_path, 'a') as handle:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # its process is alive and flushes it itself
+            paths = list(directory.glob(f'{token}-*.jsonl'))
+            states = _read_journal(paths)
+            apply(states, settings.WRITE_BEHIND_BATCH_SIZE)
+            for path in paths:
+                os.remove(path)
+            os.remove(lock_path)
+        replayed += len(states)
+    return replayed
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer(
+                    settings.WRITE_BEHIND_DIR,
+                    settings.WRITE_BEHIND_FLUSH_MS / 1000,
+                    settings.WRITE_BEHIND_BATCH_SIZE,
+                )
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+def flush():
+    return get_buffer().flush() if _buffer is not None else 0
+
+
+def overlay(user_id):
+    return _buffer.overlay(user_id) if _buffer is not None else {}
+
+
+def vote(user, movie, vote_type):
+    """Record a like/dislike click; returns ``(user vote, likes, dislikes)``
+    with the counts projected past the pending writes"""
+    from .models import Movie, MovieVote
+
+    def read():
+        stored = MovieVote.objects.filter(user=user, movie=movie).values_list('vote_type', flat=True).first()
+        likes, dislikes = Movie.objects.values_list('likes_count', 'dislikes_count').get(pk=movie.pk)
+        return stored, {'like': likes, 'dislike': dislikes}
+
+    # Clicking the same vote again removes it
+    desired, counts = get_buffer().click(
+        (VOTE, user.pk, movie.pk), read, lambda current: None if current == vote_type else vote_type
+    )
+    return desired, counts['like'], counts['dislike']
+
+
+def toggle(kind, user, movie):
+    """Record a favorite or watchlist click; returns ``(now on, projected
+    number of users with the movie in that list)``"""
+    from .models import Favorite, Movie, Watchlist
+
+    model = Favorite if kind == FAVORITE else Watchlist
+    field = 'favorites_count' if kind == FAVORITE else 'watchlist_count'
+
+    def read():
+        stored = kind if model.objects.filter(user=user, movie=movie).exists() else None
+        return stored, {kind: Movie.objects.values_list(field, flat=True).get(pk=movie.pk)}
+
+    desired, counts = get_buffer().click(
+        (kind, user.pk, movie.pk), read, lambda current: None if current else kind
+    )
+    return desired is not None, counts[kind]
@@ -15,6 +15,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.humanize',
     'cinemadia',
 ]
 
@@ -52,9 +53,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Wait for the write lock instead of failing at once under load
+        'OPTIONS': {'timeout': 20},
+        # A file, not shared memory, so threaded tests get real connections
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+CACHES = {
+    # Generations and per-user state are invalidated through this cache;
+    # point it at a shared backend such as Redis when running several
+    # processes
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Ordered result ids per search query. LocMemCache evicts the least
+    # recently used tenth of the entries once MAX_ENTRIES is reached.
+    'search': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'search-results',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 1000, 'CULL_FREQUENCY': 10},
+    },
+    # Ranked movie ids per user in front of the UserFeed table, see
+    # cinemadia.feeds
+    'feeds': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'user-feeds',
+        'TIMEOUT': 900,
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 10},
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -89,3 +119,23 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Search
+FACET_CACHE_TIMEOUT = 300  # seconds
+SPELLING_INDEX_PATH = BASE_DIR / 'spelling_index.pickle'
+
+# Page and per-user caches
+HOME_CACHE_TIMEOUT = 60  # seconds, fallback for writes that bypass signals
+USER_STATE_CACHE_TIMEOUT = 60  # seconds, fallback for writes that bypass signals
+GENERATION_CACHE_TIMEOUT = 60  # seconds, bounds staleness when the cache is not shared
+
+# Recommendations
+RELATED_INDEX_PATH = BASE_DIR / 'related_index.pickle'
+EMBEDDINGS_DIR = BASE_DIR / 'embeddings'
+
+# Votes, favorites and watchlist clicks are buffered and written in
+# batches, see cinemadia.writebehind
+WRITE_BEHIND_ENABLED = True
+WRITE_BEHIND_FLUSH_MS = 200  # milliseconds between flushes
+WRITE_BEHIND_BATCH_SIZE = 500  # states per transaction; a full buffer flushes early
+WRITE_BEHIND_DIR = BASE_DIR / 'write_behind'  # crash-safe journal of unflushed clicks